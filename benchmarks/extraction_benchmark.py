@@ -0,0 +1,98 @@
+import argparse
+import ast
+import os
+import sys
+import time
+
+import gdspy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.GDS_Object.auto_ops_propagation import AutoOPSPropagation, element_extractor, element_sorting
+from controllers.lib_reader import LibReader
+
+
+def run_extraction_benchmark(std_file, lib_file, layer_list, cell_name_list=None, repeat=3) -> dict:
+    """
+    Time the cell extraction stages over a whole standard cell library.
+
+    Every cell is extracted `repeat` times and the best time is kept for each stage to reduce the noise.
+
+    Parameters:
+    -----------
+    std_file: str
+        Path of the GDS standard cell library.
+
+    lib_file: str
+        Path of the Liberty file of the library.
+
+    layer_list: list
+        Diffusion layer, N well layer, poly silicon layer, via layers, metal layers and label layers.
+
+    cell_name_list: list(str)
+        Cells to benchmark (empty for all cells).
+
+    repeat: int
+        Number of extraction per cell.
+
+    Returns:
+    --------
+    dict:
+        The cumulated best time in seconds of each stage: element_extractor, element_sorting and AutoOPSPropagation.
+    """
+    gds_cell_list = gdspy.GdsLibrary().read_gds(std_file).cells
+    lib_reader = LibReader(lib_file)
+
+    if not cell_name_list:
+        cell_name_list = sorted(gds_cell_list.keys())
+
+    timings = {'element_extractor': 0.0, 'element_sorting': 0.0, 'AutoOPSPropagation': 0.0}
+
+    for cell_name in cell_name_list:
+        try:
+            truth_table, voltage, input_names, _ = lib_reader.extract_truth_table(cell_name)
+        except Exception:
+            continue
+
+        gds_cell = gds_cell_list[cell_name]
+        best = {key: float("inf") for key in timings}
+
+        for _ in range(repeat):
+            try:
+                start = time.perf_counter()
+                element_list = element_extractor(gds_cell, layer_list)
+                middle = time.perf_counter()
+                element_sorting(element_list, input_names, truth_table, voltage)
+                end = time.perf_counter()
+
+                AutoOPSPropagation(cell_name, gds_cell, layer_list, truth_table, voltage, input_names)
+                end_master = time.perf_counter()
+            except Exception:
+                break
+
+            best['element_extractor'] = min(best['element_extractor'], middle - start)
+            best['element_sorting'] = min(best['element_sorting'], end - middle)
+            best['AutoOPSPropagation'] = min(best['AutoOPSPropagation'], end_master - end)
+
+        for key in timings:
+            if best[key] != float("inf"):
+                timings[key] += best[key]
+
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Auto-OPS extraction benchmark')
+    parser.add_argument('-s', '--std_file', type=str, help='Input std file', required=True)
+    parser.add_argument('-l', '--lib_file', type=str, help='Input lib file', required=True)
+    parser.add_argument('-la', '--layer_list', type=str, help='Diffusion, ... [1, 5, 9, 10, 11]', required=True)
+    parser.add_argument('-c', '--cell_list', nargs='+', type=str, help='Cell list to benchmark (empty for all cells)')
+    parser.add_argument('-r', '--repeat', type=int, default=3, help='Number of extraction per cell (default 3)')
+
+    args = parser.parse_args()
+
+    results = run_extraction_benchmark(args.std_file, args.lib_file, ast.literal_eval(args.layer_list),
+                                       args.cell_list, args.repeat)
+
+    for stage, duration in results.items():
+        print(f"{stage}: {duration:.4f} seconds")
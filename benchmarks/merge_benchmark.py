@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+
+import gdspy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from controllers.GDS_Object.auto_ops_propagation import merge_polygons
+
+
+def run_merge_benchmark(std_file, repeat=5) -> tuple[float, int, int]:
+    """
+    Time merge_polygons over every layer of every cell of a GDS library.
+
+    Parameters:
+    -----------
+    std_file: str
+        Path of the GDS standard cell library.
+
+    repeat: int
+        Number of runs over the library, the best one is kept.
+
+    Returns:
+    --------
+    tuple[float, int, int]:
+        The best run time in seconds, the number of input polygons and the number of merged shapes.
+    """
+    gds_cell_list = gdspy.GdsLibrary().read_gds(std_file).cells
+
+    layer_polygons = []
+    for gds_cell in gds_cell_list.values():
+        layer_polygons.extend(gds_cell.get_polygons(by_spec=True).values())
+
+    polygon_counter = sum(len(polygons) for polygons in layer_polygons)
+    shape_counter = 0
+    best_time = float("inf")
+
+    for _ in range(repeat):
+        shape_counter = 0
+        start = time.perf_counter()
+        for polygons in layer_polygons:
+            shape_counter += len(merge_polygons(polygons))
+        best_time = min(best_time, time.perf_counter() - start)
+
+    return best_time, polygon_counter, shape_counter
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Auto-OPS merge_polygons micro-benchmark')
+    parser.add_argument('-s', '--std_file', type=str, default='input/stdcells.gds', help='Input std file')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='Number of runs over the library (default 5)')
+
+    args = parser.parse_args()
+
+    duration, polygon_number, shape_number = run_merge_benchmark(args.std_file, args.repeat)
+
+    print(f"merge_polygons: {duration:.4f} seconds for {polygon_number} polygons merged into {shape_number} shapes")
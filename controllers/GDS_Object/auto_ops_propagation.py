@@ -1,13 +1,23 @@
+import itertools
+
 from controllers.GDS_Object.attribute import Attribute
 from controllers.GDS_Object.diffusion import Diffusion
 from controllers.GDS_Object.label import Label
+from controllers.GDS_Object.net_graph import NetGraph, pack_lanes, unpack_lanes
+from controllers.GDS_Object.propagation_state import PropagationState
 from controllers.GDS_Object.shape import Shape
+from controllers.GDS_Object.spatial_index import SpatialIndex
 
-from shapely.geometry import Polygon, Point
+import numpy as np
+import shapely
+from shapely.geometry import Polygon
 from shapely.ops import unary_union
+from shapely.strtree import STRtree
 
 from controllers.GDS_Object.type import ShapeType
+from controllers.GDS_Object.via_adjacency import ViaAdjacency
 from controllers.GDS_Object.zone import Zone
+from controllers.lib_reader import input_pattern_index
 
 
 class AutoOPSPropagation:
@@ -18,20 +28,23 @@ class AutoOPSPropagation:
         cell_name (str): The name of the cell in the gds file in the Cells' list.
         gds_cell (GdsLibrary): Dictionary of cells in the library's object, indexed by name.
         layer_list (list[list[int]]): Diffusion layer, N well layer, poly silicon layer, via layers, metal layers and label layers.
-        truthtable (dict{list[set(dict)]}): A list containing the information the output based on the input for a cell.
+        truthtable (dict{np.ndarray}): The output values of each output indexed by the input pattern integer (None for a flip-flop output).
         voltage(list[dict]): Contains the voltage names and types.
         inputs_list(list(str)): Contains the inputs names.
     Attributes:
         name (str): The name of the cell in the gds file in the Cells' list.
-        truthtable (dict{list[set(dict)]}): A list containing the information the output based on the input for a cell.
+        truthtable (dict{np.ndarray}): The output values of each output indexed by the input pattern integer (None for a flip-flop output).
         inputs_list(list(str)): Contains the inputs names.
 
 
         via_element_list(list) Contains all the extracted via elements converted to objects.
         element_list(list): Contains all the extracted elements converted to objects.
         reflection_list(list): Contains all reflecting elements such as diffusion's zones and poly-silicon's overlapping.
-        orientation_list(dict): Contains all cell orientation reflective zones and states
+        orientation_list(dict): Contains the reflective zone geometry of every cell orientation, shared by all the states
         inputs(dict): Contains all aplied inputs values
+        flip_flop(int): The applied flip-flop output Q
+        input_attribute_list(list[Attribute]): Contains the input attributes of the cell.
+        output_attribute_list(list[tuple]): Contains the output attributes with their truth table and flip-flop inversion.
 
     Example:
         To create a AutoOPSPropagation instance:
@@ -42,7 +55,7 @@ class AutoOPSPropagation:
         >>>         "INV_X1",
         >>>         gds_cell,
         >>>         [[1, 0], [5, 0], [9, 0], [[10, 0]], [[11, 0]], [[11, 0]]],
-        >>>         {'ZN': [({'A': True}, {'ZN': False}), ({'A': False}, {'ZN': True})]},
+        >>>         {'ZN': np.array([True, False])},
         >>>         [{'name': 'VDD', 'type': 'primary_power'}, {'name': 'VSS', 'type': 'primary_ground'}],
         >>>         ['A']
         >>>     )
@@ -56,12 +69,12 @@ class AutoOPSPropagation:
         self.truthtable = truthtable
         self.inputs_list = inputs_list
         self.via_element_list = []
-        self.orientation_list = {}
 
         self.element_list = element_extractor(gds_cell, layer_list)
         self.reflection_list = []
 
         self.inputs = {}
+        self.flip_flop = None
 
         # list without the filtering of unused diffusion zones
         temp_reflection_list = element_sorting(self.element_list, inputs_list, truthtable, voltage)
@@ -76,13 +89,43 @@ class AutoOPSPropagation:
 
         self.element_list = elements_to_keep
 
+        poly_index = SpatialIndex(self.element_list, ShapeType.POLYSILICON)
+
         for diffusion in temp_reflection_list:
-            is_intersecting = connect_diffusion_to_polygon(self.element_list, diffusion)
+            is_intersecting = connect_diffusion_to_polygon(self.element_list, diffusion, poly_index)
             if is_intersecting:
                 self.reflection_list.append(diffusion)
 
+        via_adjacency = ViaAdjacency(self.element_list)
+
+        for diffusion in self.reflection_list:
+            connect_diffusion_to_metal(self.element_list, diffusion, via_adjacency)
+
+        # The zone order is fixed once so that every state result shares the same zone indexing
         for diffusion in self.reflection_list:
-            connect_diffusion_to_metal(self.element_list, diffusion)
+            diffusion.zone_list = sorted(diffusion.zone_list, key=lambda selected_zone: selected_zone.get_min_x_coord())
+
+        # The zone connectivity is compiled once, each state is then resolved by sweeping the graph diffusions until
+        # the number of unknown zones is stable
+        self.net_graph = NetGraph(self.reflection_list)
+
+        # The geometry does not depend on the state, each state only stores its zone state vector
+        self.orientation_list = self.calculate_orientations()
+
+        # The input and output attributes are indexed once so that apply_state does not search the truth table
+        self.input_attribute_list = []
+        self.output_attribute_list = []
+
+        for element in self.element_list:
+            if isinstance(element, Shape) and isinstance(element.attribute, Attribute):
+                if element.attribute.shape_type == ShapeType.INPUT:
+                    self.input_attribute_list.append(element.attribute)
+
+                elif element.attribute.shape_type == ShapeType.OUTPUT and element.attribute.label in truthtable.keys():
+                    output_truth_table = truthtable[element.attribute.label]
+                    # A flip-flop output (no truth table) is the stored state Q, inverted for the N outputs
+                    is_inverted = output_truth_table is None and "N" in element.attribute.label
+                    self.output_attribute_list.append((element.attribute, output_truth_table, is_inverted))
 
     def get_height(self) -> float:
         """
@@ -136,20 +179,20 @@ class AutoOPSPropagation:
 
         return min_x + max_x
 
-    def calculate_orientations(self) -> None:
+    def calculate_orientations(self) -> dict:
         """
-        This function is to fill the orientation list to be able to get the cell_state for each of them.
+        This function is to compute the reflective zone coordinates of every cell orientation, once per cell.
 
         Possible orientation are N, FN, E, FE, S, FS, W, FW.
 
-        To get the cell orientation from the propagation object:
-
-        propagation_object.orientation_list["N"]
+        The zones are in the state vector order (see PropagationState), the state of a zone in an orientation is:
 
+        propagation_object.state_vector[zone_index]
 
         Returns:
         --------
-        None
+        dict: For every orientation, the coordinates ('coords': list of x and y arrays), the bounding boxes ('bounds':
+        zones x (min_x, max_x, min_y, max_y) array) and the PMOS zones ('is_pmos': bool array) of the reflective zones.
 
         Raises:
         -------
@@ -159,15 +202,84 @@ class AutoOPSPropagation:
         orientation_side = ["N", "FN", "E", "FE", "S", "FS", "W", "FW"]
 
         cell_height = self.get_height()
+        is_pmos = np.array([reflection.shape_type == ShapeType.PMOS for reflection in self.reflection_list
+                            for _ in reflection.zone_list], dtype=bool)
 
+        orientation_list = {}
         for orientation in orientation_side:
-            self.orientation_list[orientation] = []
+            coordinate_list = []
             for reflection in self.reflection_list:
                 for zone in reflection.zone_list:
                     x, y = apply_transformation(zone.coordinates, orientation, reflection.get_diff_width(), cell_height)
-                    self.orientation_list[orientation].append(
-                        {'coords': [x, y], 'state': zone.state, "diff_type": reflection.shape_type}
-                    )
+                    coordinate_list.append((np.array(x, dtype=float), np.array(y, dtype=float)))
+
+            bounds = np.array([(x.min(), x.max(), y.min(), y.max()) for x, y in coordinate_list],
+                              dtype=float).reshape(-1, 4)
+            orientation_list[orientation] = {'coords': coordinate_list, 'bounds': bounds, 'is_pmos': is_pmos}
+
+        return orientation_list
+
+    def get_zone_states(self) -> tuple[tuple]:
+        """
+        This function is to get the current state of every zone, grouped by diffusion in the reflection list order.
+
+        Returns:
+        --------
+        tuple(tuple): The zone states.
+        """
+
+        return tuple(tuple(zone.state for zone in diffusion.zone_list) for diffusion in self.reflection_list)
+
+    @property
+    def state_vector(self) -> np.ndarray:
+        """
+        The current state of every zone in the net graph zone order, -1 for the unknown states.
+        """
+
+        return np.array([-1 if zone.state is None else zone.state for zone in self.net_graph.zone_list], dtype=np.int8)
+
+    def iter_zones(self):
+        """
+        This function is to iterate over the (diffusion, zone, state) of every reflective zone of the cell.
+        """
+
+        for diffusion in self.reflection_list:
+            for zone in diffusion.zone_list:
+                yield diffusion, zone, zone.state
+
+    def get_state_result(self) -> PropagationState:
+        """
+        This function is to store the last applied propagation without copying the cell geometry.
+
+        Returns:
+        --------
+        PropagationState: The zone states of the applied inputs, sharing this instance geometry.
+        """
+
+        return PropagationState(self, self.inputs, self.flip_flop, self.state_vector)
+
+    def reset_state(self) -> None:
+        """
+        This function is to clear every state set by a previous propagation, so that the same instance can be used
+        for all the input combinations.
+
+        Returns:
+        --------
+        None
+        """
+
+        self.inputs = {}
+        self.flip_flop = None
+
+        for element in self.element_list:
+            if isinstance(element, Shape):
+                element.state = None
+                if isinstance(element.attribute, Attribute):
+                    element.attribute.state = None
+
+        for diffusion in self.reflection_list:
+            for zone in diffusion.zone_list:
+                zone.state = None
 
     def apply_state(self, inputs, flip_flop=0) -> None:
         """
@@ -192,50 +304,126 @@ class AutoOPSPropagation:
 
         """
 
+        self.reset_state()
+
         self.inputs = inputs
+        self.flip_flop = flip_flop
 
         if flip_flop is None:
             flip_flop = 0
 
-        for element in self.element_list:
-            if isinstance(element, Shape) and element.attribute is not None and isinstance(element.attribute, Attribute):
-                if element.attribute.shape_type == ShapeType.INPUT:
-                    if element.attribute.label in inputs.keys():
-                        element.attribute.set_state(inputs[element.attribute.label])
-
-                elif element.attribute.shape_type == ShapeType.OUTPUT:
-                    for outputs in self.truthtable:
-                        for truthtable_inputs, output in self.truthtable[outputs]:
-                            if element.attribute.label in outputs and element.attribute.label in output.keys():
-                                is_equal = False
-                                for truthtable_inputs_value, truthtable_inputs_key in enumerate(truthtable_inputs):
-                                    if truthtable_inputs_key not in inputs or inputs[truthtable_inputs_key] != truthtable_inputs[truthtable_inputs_key]:
-                                        is_equal = False
-                                        break
-                                    else:
-                                        is_equal = True
-
-                                if is_equal:
-                                    if any("CK" in name or "RESET" in name or "GATE" in name or "CLK" in name for name in list(inputs.keys())) or "Q" in outputs:
-                                        if "N" in list(output.keys())[0]:
-                                            value = bool(not flip_flop)
-                                        else:
-                                            value = bool(flip_flop)
-                                        element.attribute.set_state(value)
-                                    else:
-                                        element.attribute.set_state(output[element.attribute.label])
-
-        none_counter = 0
-        none_loop_counter = 0
-        while True:
-            new_none_counter = set_zone_states(self.reflection_list)
-
-            if none_counter == new_none_counter:
-                break
+        # None if an input is missing, the outputs are then not set
+        pattern_index = input_pattern_index(inputs, self.inputs_list)
+
+        for attribute in self.input_attribute_list:
+            if attribute.label in inputs.keys():
+                attribute.set_state(inputs[attribute.label])
+
+        if pattern_index is not None:
+            for attribute, output_truth_table, is_inverted in self.output_attribute_list:
+                if output_truth_table is None:
+                    attribute.set_state(bool(flip_flop) != is_inverted)
+                else:
+                    attribute.set_state(bool(output_truth_table[pattern_index]))
+
+        zone_states, shape_states = self.net_graph.propagate()
+
+        for zone, state in zip(self.net_graph.zone_list, zone_states):
+            zone.state = state
+
+        for shape, state in zip(self.net_graph.shape_list, shape_states):
+            shape.state = state
+
+    def apply_all_states(self, is_flip_flop=False, flip_flop=0) -> tuple[np.ndarray, np.ndarray]:
+        """
+        This function is to propagate the body voltage of every input combination at once.
+
+        The combinations are the lanes of bitsets (bit i of every zone state is the combination i), in the
+        itertools.product([0, 1], repeat=n) order: the first input is the most significant bit and the flip-flop output
+        Q is the last bit. The instance states are not changed.
+
+        Parameters:
+        -----------
+        is_flip_flop: bool
+            The flip-flop output Q is also enumerated, as the last bit of each combination.
+
+        flip_flop: int
+            The flip-flop output Q of every combination if is_flip_flop is False (None for 0).
+
+        Returns:
+        --------
+        tuple[np.ndarray, np.ndarray]:
+            The state matrix (zones x combinations) of int8, -1 for the unknown states, in the net graph zone order,
+            and True for each combination failing as apply_state (an input or output source without state).
+        """
+        input_number = len(self.inputs_list)
+        combination_number = 2 ** (input_number + int(is_flip_flop))
+        lanes = np.arange(combination_number)
+
+        # Each lane is a combination, the truth table rows are indexed by the inputs only
+        pattern_index = lanes >> int(is_flip_flop)
+        if is_flip_flop:
+            flip_flop_lanes = (lanes & 1).astype(bool)
+        else:
+            flip_flop_lanes = np.full(combination_number, bool(flip_flop))
+
+        valid_lanes = (1 << combination_number) - 1
+        attribute_bitsets = {}
+
+        for attribute in self.input_attribute_list:
+            if attribute.label in self.inputs_list:
+                input_index = self.inputs_list.index(attribute.label)
+                input_lanes = (pattern_index >> (input_number - 1 - input_index)) & 1
+                attribute_bitsets[attribute] = (pack_lanes(input_lanes), valid_lanes)
+
+        for attribute, output_truth_table, is_inverted in self.output_attribute_list:
+            if output_truth_table is None:
+                output_lanes = flip_flop_lanes != is_inverted
             else:
-                none_counter = new_none_counter
+                output_lanes = np.asarray(output_truth_table, dtype=bool)[pattern_index]
+            attribute_bitsets[attribute] = (pack_lanes(output_lanes), valid_lanes)
+
+        zone_known, zone_value, failed = self.net_graph.propagate_bitsets(attribute_bitsets, combination_number)
 
-            none_loop_counter += 1
+        state_matrix = unpack_lanes(zone_value, combination_number).astype(np.int8)
+        state_matrix[~unpack_lanes(zone_known, combination_number)] = -1
+
+        return state_matrix, unpack_lanes([failed], combination_number)[0]
+
+    def get_all_state_results(self, is_flip_flop=False, flip_flop=0) -> list:
+        """
+        This function is to store the propagation of every input combination without copying the cell geometry.
+
+        Parameters:
+        -----------
+        is_flip_flop: bool
+            The flip-flop output Q is also enumerated, as the last bit of each combination.
+
+        flip_flop: int
+            The flip-flop output Q of every combination if is_flip_flop is False.
+
+        Returns:
+        --------
+        list[PropagationState | None]:
+            The state result of each combination in the itertools.product order, None if its propagation fails.
+        """
+        state_matrix, failed = self.apply_all_states(is_flip_flop, flip_flop)
+        # One contiguous row per combination, the state vectors are views of this matrix
+        state_vector_list = np.ascontiguousarray(state_matrix.T)
+        combination_list = itertools.product([0, 1], repeat=len(self.inputs_list) + int(is_flip_flop))
+
+        state_result_list = []
+        for lane, combination in enumerate(combination_list):
+            if failed[lane]:
+                state_result_list.append(None)
+                continue
+
+            inputs = dict(zip(self.inputs_list, combination))
+            lane_flip_flop = combination[-1] if is_flip_flop else flip_flop
+
+            state_result_list.append(PropagationState(self, inputs, lane_flip_flop, state_vector_list[lane]))
+
+        return state_result_list
 
 
 def apply_transformation(coordinates, transformation, width, height) -> tuple[tuple, tuple]:
@@ -320,8 +508,8 @@ def element_sorting(element_list, inputs_list, truthtable, voltage) -> list:
      inputs_list: list(str)
         Contains the inputs name.
 
-     truthtable:  dict{list[set(dict)]}
-        A list containing the information the output based on the input for a cell.
+     truthtable:  dict{np.ndarray}
+        The output values of each output indexed by the input pattern integer.
 
      voltage: list[dict]
         Contains the voltage names and types.
@@ -339,19 +527,23 @@ def element_sorting(element_list, inputs_list, truthtable, voltage) -> list:
 
     reflection_list = []
 
+    via_index = SpatialIndex(element_list, ShapeType.VIA)
+    nwell_index = SpatialIndex(element_list, ShapeType.NWELL)
+
     for element in element_list:
         if isinstance(element, Shape) and (
                 element.shape_type == ShapeType.METAL or element.shape_type == ShapeType.DIFFUSION or element.shape_type == ShapeType.POLYSILICON):
-            for via in element_list:
-                if isinstance(via, Shape) and via.shape_type == ShapeType.VIA \
-                        and element.polygon.intersects(via.polygon) and \
-                        (via.layer_level == element.layer_level or via.layer_level == element.layer_level + 1):
+            for via in via_index.query(element.polygon):
+                if via.layer_level == element.layer_level or via.layer_level == element.layer_level + 1:
                     element.add_via(via)
 
+    # The labels are assigned to the metals in a single spatial query for the whole cell
+    set_label_attributes(element_list, inputs_list, truthtable, voltage)
+
     for element in element_list:
         if isinstance(element, Shape) and element.attribute is None:
             # TODO check why this loop is entering already defined attribut
-            is_connected(element_list, inputs_list, truthtable, voltage, element)
+            is_connected(element_list, element)
 
     for element in element_list:
         # To set up diffusion number if connected to at least one metal
@@ -360,17 +552,9 @@ def element_sorting(element_list, inputs_list, truthtable, voltage) -> list:
 
             diffusion = Diffusion(element.polygon)
 
-            is_p_mos = False
-            for item in element_list:
-                if isinstance(element, Shape) \
-                        and isinstance(item, Shape) \
-                        and item.shape_type == ShapeType.NWELL \
-                        and item.polygon.intersects(element.polygon):
-                    diffusion.set_type(ShapeType.PMOS)
-                    is_p_mos = True
-                    break
-
-            if not is_p_mos:
+            if len(nwell_index.query(element.polygon)) > 0:
+                diffusion.set_type(ShapeType.PMOS)
+            else:
                 diffusion.set_type(ShapeType.NMOS)
 
             reflection_list.append(diffusion)
@@ -382,6 +566,10 @@ def merge_polygons(polygons) -> list[Polygon]:
     A shape could be created from multiple polygones.
     This function merge them to have only one shape based on coordinates.
 
+    Touching polygons are grouped with a union-find over the intersecting pairs returned by a single STRtree
+    query, then each connected group is merged with unary_union.
+    The groups are returned in the order of their first polygon in the input list.
+
     Parameters:
     -----------
     polygons : list[list[x, y]]
@@ -397,28 +585,54 @@ def merge_polygons(polygons) -> list[Polygon]:
     Any relevant exceptions that may occur.
     """
 
-    polygons = [Polygon(p) for p in polygons]
+    polygons = polygons_from_coordinates(polygons)
+
+    parent = list(range(len(polygons)))
 
-    # Create a list to hold merged polygons
-    merged_polygons = []
+    def find(index) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
 
-    while len(polygons) > 0:
-        current_polygon = polygons.pop(0)  # Take the first polygon in the list
-        connected_polygons = [current_polygon]
+    if len(polygons) > 1:
+        tree = STRtree(polygons)
+        for first, second in zip(*tree.query(polygons, predicate="intersects")):
+            first_root, second_root = find(first), find(second)
+            if first_root != second_root:
+                # Keep the lowest index as root to preserve the input order of the groups
+                parent[max(first_root, second_root)] = min(first_root, second_root)
 
-        i = 0
-        while i < len(connected_polygons):
-            for other_polygon in polygons:
-                if connected_polygons[i].intersects(other_polygon):
-                    connected_polygons.append(other_polygon)
-                    polygons.remove(other_polygon)
-            i += 1
+    connected_groups = {}
+    for index, polygon in enumerate(polygons):
+        connected_groups.setdefault(find(index), []).append(polygon)
 
-        # Merge connected polygons using unary_union
-        merged_polygon = unary_union(connected_polygons)
-        merged_polygons.append(merged_polygon)
+    # Merge connected polygons using unary_union
+    return [unary_union(connected_polygons) for connected_polygons in connected_groups.values()]
 
-    return merged_polygons
+
+def polygons_from_coordinates(polygons) -> list[Polygon]:
+    """
+    Create the Shapely polygons of every extracted GDS polygon in a single vectorized call.
+
+    Parameters:
+    -----------
+    polygons : list[list[x, y]]
+        A list of x and y points for each extracted polygones stored in that list.
+
+    Returns:
+    --------
+    list[Polygon]:
+        The polygons in the same order as the input list.
+    """
+
+    if len(polygons) == 0:
+        return []
+
+    vertex_counts = [len(points) for points in polygons]
+    rings = shapely.linearrings(np.concatenate(polygons), indices=np.repeat(np.arange(len(polygons)), vertex_counts))
+
+    return list(shapely.polygons(rings))
 
 
 def element_extractor(gds_cell, layer_list) -> list:
@@ -478,14 +692,47 @@ def extract_and_merge_polygons(polygons, element_list, layer_index, layer, layer
         element_list.append(shape)
 
 
-def is_connected(element_list, inputs_list, truthtable, voltage, element) -> None:
+def is_connected(element_list, element) -> None:
     """
     This function is to link element together.
 
     If a metal and a poly silicon are linked, the function add the metal as an attribute to the poly silicon.
 
-    If a metal is linked to a label, the function add an instance of Attribute to the metal.
+    Parameters:
+    -----------
+     element_list: list
+        Contains all the extracted elements converted to objects.
+
+    element : Shape | Label
+        Objects in the class element list instance
 
+    Returns:
+    --------
+    None
+
+    Raises:
+    -------
+    Exception
+        Any relevant exceptions that may occur.
+
+    """
+    if element.shape_type == ShapeType.POLYSILICON or element.shape_type == ShapeType.DIFFUSION:
+        for item in element_list:
+            if isinstance(item,
+                          Shape) and item.shape_type == ShapeType.METAL and item.layer_level != element.layer_level:
+                for element_connection in element.connection_list:
+                    if element_connection in item.connection_list:
+                        element.set_attribute(item)
+                        break
+
+
+def set_label_attributes(element_list, inputs_list, truthtable, voltage) -> None:
+    """
+    This function is to add an instance of Attribute to every metal linked to a label.
+
+    A metal is linked to the first label (in the element list order) inside its polygon, or to the first ground or
+    power label on the y coordinate of one of its vertices. The labels inside the metals are found with a single
+    STRtree query for the whole cell.
 
     Parameters:
     -----------
@@ -495,15 +742,12 @@ def is_connected(element_list, inputs_list, truthtable, voltage, element) -> Non
      inputs_list: list(str)
         Contains the inputs name.
 
-     truthtable:  dict{list[set(dict)]}
-        A list containing the information the output based on the input for a cell.
+     truthtable:  dict{np.ndarray}
+        The output values of each output indexed by the input pattern integer.
 
      voltage: list[dict]
         Contains the voltage names and types.
 
-    element : Shape | Label
-        Objects in the class element list instance
-
     Returns:
     --------
     None
@@ -513,9 +757,74 @@ def is_connected(element_list, inputs_list, truthtable, voltage, element) -> Non
     Exception
         Any relevant exceptions that may occur.
         Label missing but found in the GDS file.
-        Input missing but found in the GDS file.
 
     """
+    ground_pin_name, power_pin_name = get_supply_pin_names(voltage)
+
+    label_list = [element for element in element_list if isinstance(element, Label)]
+    metal_list = [element for element in element_list if isinstance(element, Shape)
+                  and element.shape_type == ShapeType.METAL and element.attribute is None]
+
+    if not label_list or not metal_list:
+        return
+
+    # Labels inside each metal polygon
+    label_tree = STRtree(shapely.points([label.coordinates for label in label_list]))
+    metal_indexes, label_indexes = label_tree.query([metal.polygon for metal in metal_list], predicate="contains")
+
+    contained_labels = [[] for _ in metal_list]
+    for metal_index, label_index in zip(metal_indexes.tolist(), label_indexes.tolist()):
+        contained_labels[metal_index].append(label_index)
+
+    # Ground and power labels, found on the metal vertices y coordinates
+    supply_label_list = [(label_index, label) for label_index, label in enumerate(label_list)
+                         if label.name.lower() in (ground_pin_name.lower(), power_pin_name.lower())]
+
+    for metal, metal_labels in zip(metal_list, contained_labels):
+        label_index = min(metal_labels, default=len(label_list))
+
+        metal_y = set(metal.coordinates[1])
+        for supply_label_index, label in supply_label_list:
+            if supply_label_index >= label_index:
+                break
+            if label.coordinates[1] in metal_y:
+                label_index = supply_label_index
+                break
+
+        if label_index == len(label_list):
+            continue
+
+        label = label_list[label_index]
+        if label_index in metal_labels:
+            if label.name in inputs_list:
+                metal.set_attribute(Attribute(ShapeType.INPUT, label.name))
+
+            elif label.name in truthtable.keys():
+                metal.set_attribute(Attribute(ShapeType.OUTPUT, label.name))
+
+            elif label.name.lower() == "vss":
+                metal.set_attribute(Attribute(ShapeType.VSS))
+            elif label.name.lower() == "vdd":
+                metal.set_attribute(Attribute(ShapeType.VDD))
+            else:
+                raise Exception("Missing label: " + str(label.name))
+
+        elif label.name.lower() == ground_pin_name.lower():
+            metal.set_attribute(Attribute(ShapeType.VSS))
+
+        else:
+            metal.set_attribute(Attribute(ShapeType.VDD))
+
+
+def get_supply_pin_names(voltage) -> tuple[str, str]:
+    """
+    This function is to get the ground and power pin names of the cell, the last of each type.
+
+    Returns:
+    --------
+    tuple[str, str]:
+        The ground and power pin names, empty if not found.
+    """
     ground_pin_name = power_pin_name = ""
     for volt in voltage:
         if "ground" in volt["type"]:
@@ -523,56 +832,10 @@ def is_connected(element_list, inputs_list, truthtable, voltage, element) -> Non
         elif "power" in volt["type"]:
             power_pin_name = volt["name"]
 
+    return ground_pin_name, power_pin_name
 
-    if element.shape_type == ShapeType.POLYSILICON or element.shape_type == ShapeType.DIFFUSION:
-        for item in element_list:
-            if isinstance(item,
-                          Shape) and item.shape_type == ShapeType.METAL and item.layer_level != element.layer_level:
-                for element_connection in element.connection_list:
-                    if element_connection in item.connection_list:
-                        element.set_attribute(item)
-                        break
-
-    elif element.shape_type == ShapeType.METAL and element.attribute is None:
-        for label in element_list:
-            if isinstance(label, Label):
-                if element.polygon.contains(Point(label.coordinates)):
-                    if label.name in inputs_list:
-                        element.set_attribute(Attribute(ShapeType.INPUT, label.name))
-                        break
-
-                    elif label.name in truthtable.keys():
-                        element.set_attribute(Attribute(ShapeType.OUTPUT, label.name))
-                        break
 
-                    elif label.name.lower() == "vss":
-                        element.set_attribute(Attribute(ShapeType.VSS))
-                        break
-                    elif label.name.lower() == "vdd":
-                        element.set_attribute(Attribute(ShapeType.VDD))
-                        break
-                    else:
-                        raise Exception("Missing label: " + str(label.name))
-                else:
-                    _, point_y = label.coordinates
-                    _, metal_y = element.coordinates
-                    set_metal_y = set(metal_y)
-                    is_label_found = False
-                    for y in set_metal_y:
-                        if y == point_y:
-                            is_label_found = True
-                            break
-
-                    if label.name.lower() == ground_pin_name.lower() and is_label_found:
-                        element.set_attribute(Attribute(ShapeType.VSS))
-                        break
-
-                    elif label.name.lower() == power_pin_name.lower() and is_label_found:
-                        element.set_attribute(Attribute(ShapeType.VDD))
-                        break
-
-
-def connect_diffusion_to_polygon(element_list, diffusion) -> bool:
+def connect_diffusion_to_polygon(element_list, diffusion, poly_index=None) -> bool:
     """
     To set up zones where the poly silicon overlap to the diffusion parts.
     Creating a zone from the overlaps coordinates.
@@ -585,9 +848,13 @@ def connect_diffusion_to_polygon(element_list, diffusion) -> bool:
     diffusion : Diffusion
         Objects in the class reflection list instance which hold the reflection zone objects
 
+    poly_index : SpatialIndex
+        Optional spatial index of the cell poly silicon shapes, built from the element list if not provided.
+
     Returns:
     --------
-    None
+    bool:
+        True if at least one poly silicon overlaps the diffusion.
 
     Raises:
     -------
@@ -595,18 +862,19 @@ def connect_diffusion_to_polygon(element_list, diffusion) -> bool:
         Any relevant exceptions that may occur.
     """
     # If a diffusion zone does not intersect any poly the
+    if poly_index is None:
+        poly_index = SpatialIndex(element_list, ShapeType.POLYSILICON)
+
     poly_element_list = []
-    for element in element_list:
-        if isinstance(element, Shape) and element.shape_type == ShapeType.POLYSILICON:
-            if element.polygon.intersects(diffusion.polygon):
-                intersections = diffusion.polygon.intersection(element.polygon)
-                if hasattr(intersections, "geoms"):
-                    for index, inter in enumerate(intersections.geoms):
-                        diffusion.set_zone(Zone(ShapeType.POLYSILICON, inter.exterior.xy, [element]))
-                else:
-                    diffusion.set_zone(Zone(ShapeType.POLYSILICON, intersections.exterior.xy, [element]))
+    for element in poly_index.query(diffusion.polygon):
+        intersections = diffusion.polygon.intersection(element.polygon)
+        if hasattr(intersections, "geoms"):
+            for index, inter in enumerate(intersections.geoms):
+                diffusion.set_zone(Zone(ShapeType.POLYSILICON, inter.exterior.xy, [element]))
+        else:
+            diffusion.set_zone(Zone(ShapeType.POLYSILICON, intersections.exterior.xy, [element]))
 
-                poly_element_list.append(element.polygon)
+        poly_element_list.append(element.polygon)
 
     diffusion_zones = diffusion.polygon.difference(unary_union(poly_element_list))
     if hasattr(diffusion_zones, "geoms"):
@@ -616,7 +884,7 @@ def connect_diffusion_to_polygon(element_list, diffusion) -> bool:
     return len(poly_element_list) > 0
 
 
-def connect_diffusion_to_metal(element_list, diffusion) -> None:
+def connect_diffusion_to_metal(element_list, diffusion, via_adjacency=None) -> None:
     """
     Identify each zones where a metal layer is connected through a via connection.
 
@@ -628,6 +896,8 @@ def connect_diffusion_to_metal(element_list, diffusion) -> None:
     diffusion : Diffusion
         Objects in the class reflection list instance which hold the reflection zone objects
 
+    via_adjacency : ViaAdjacency
+        Optional via connectivity of the cell metal shapes, built from the element list if not provided.
 
     Returns:
     --------
@@ -638,33 +908,27 @@ def connect_diffusion_to_metal(element_list, diffusion) -> None:
     Exception
         Any relevant exceptions that may occur.
     """
+    if via_adjacency is None:
+        via_adjacency = ViaAdjacency(element_list)
 
     for zone in diffusion.zone_list:
         if zone.shape_type == ShapeType.DIFFUSION:
             zone_polygon = Polygon(zip(zone.coordinates[0], zone.coordinates[1]))
-            for element in element_list:
-                if (
-                        isinstance(element, Shape)
-                        and element.shape_type == ShapeType.METAL
-                        and element.layer_level == 1
-                ):
-                    for connection_polygons in element.connection_list:
-                        if (
-                                connection_polygons.layer_level == 1
-                                and zone_polygon.intersects(connection_polygons.polygon)
-                        ):
-                            zone.set_connected_to(element)
-                            add_connection_zone(element_list, element, zone)
-                            break
+            for element in via_adjacency.query_level_one(zone_polygon):
+                zone.set_connected_to(element)
+                add_connection_zone(element_list, element, zone, via_adjacency)
 
         elif zone.shape_type == ShapeType.POLYSILICON:
-            add_connection_zone(element_list, zone.connected_to[0], zone)
+            add_connection_zone(element_list, zone.connected_to[0], zone, via_adjacency)
 
 
-def add_connection_zone(element_list, element, zone) -> None:
+def add_connection_zone(element_list, element, zone, via_adjacency=None) -> None:
     """
     While not all element are reflecting, this function is to link an element connected to a reflective zone.
 
+    From the element, the first metal sharing a via and not yet connected to the zone is linked, then the search goes
+    on from this metal.
+
     Parameters:
     -----------
      element_list: list
@@ -676,42 +940,8 @@ def add_connection_zone(element_list, element, zone) -> None:
     zone: Zone
         The zone object with all the properties
 
-    Returns:
-    --------
-    None
-
-    Raises:
-    -------
-    Exception
-        Any relevant exceptions that may occur.
-
-    """
-
-    for next_element in element_list:
-        if (
-                isinstance(next_element, Shape)
-                and next_element.shape_type == ShapeType.METAL
-                and next_element not in zone.connected_to
-                and any(connection in next_element.connection_list for connection in element.connection_list)
-        ):
-            zone.set_connected_to(next_element)
-            add_connection_zone(element_list, next_element, zone)
-            return
-
-
-def set_zone_states(reflection_list) -> int:
-    """
-    This function is to determine a state for all the diffusion zones.
-
-    First loop to set the known states to the zones (inputs, outputs, VDD, VSS)
-    Second loop to set a state to poly silicons and metals which are connected together.
-    Third loop to give a state to each zone which is not connected to either a metal or a poly silicon.
-
-
-    Parameters:
-    -----------
-    reflection_list: list
-        Contains all reflecting elements as diffusion's zones and poly-silicon's overlapping.
+    via_adjacency : ViaAdjacency
+        Optional via connectivity of the cell metal shapes, built from the element list if not provided.
 
     Returns:
     --------
@@ -721,203 +951,17 @@ def set_zone_states(reflection_list) -> int:
     -------
     Exception
         Any relevant exceptions that may occur.
-        None type for diffusion shape type during the previous steps.
-        GCK input or output which are not covered.
-        Wrong or unknown attribut applied to metal.
 
     """
-    state_counter = 0
-
-    for diffusion in reflection_list:
-
-        if diffusion.shape_type is None:
-            Exception("Error diffusion shape type none")
-
-        diffusion.zone_list = sorted(diffusion.zone_list, key=lambda selected_zone: selected_zone.get_min_x_coord())
-
-        # known state loop
-        for zone_index, zone in enumerate(diffusion.zone_list):
-            if zone.state is not None:
-                for connected_path in zone.connected_to:
-                    connected_path.set_state(zone.state)
-                continue
-
-            if len(zone.connected_to) > 0:
-                for connection in zone.connected_to:
-
-                    # to apply the state in the all path for opti
-                    if connection.state is not None:
-                        zone.set_state(connection.state)
-
-                        for connected_path in zone.connected_to:
-                            connected_path.set_state(connection.state)
-
-                        break
-
-                    if isinstance(connection.attribute, Attribute):
-                        if connection.attribute.shape_type == ShapeType.VDD:
-                            zone.set_state(1)
-                            break
-                        elif connection.attribute.shape_type == ShapeType.VSS:
-                            zone.set_state(0)
-                            break
-
-                        elif connection.attribute.shape_type == ShapeType.OUTPUT or \
-                                connection.attribute.shape_type == ShapeType.INPUT:
-                            zone.set_state(connection.attribute.state)
-
-                            break
-
-                    elif isinstance(connection.attribute, Shape) and isinstance(
-                            connection.attribute.attribute,
-                            Attribute) and connection.attribute.attribute.shape_type == ShapeType.INPUT:
-                        zone.set_state(connection.attribute.attribute.state)
-                        break
-
-        # Unknown loop
-        for index, zone in enumerate(diffusion.zone_list):
-            if zone.shape_type == ShapeType.POLYSILICON:
-                find_incoherent_states(diffusion, index, zone)
-                continue
-
-            elif zone.state is not None:
-                continue
-
-            found_state = find_neighbor_state(diffusion, index)
-            if found_state is not None:
-                zone.set_state(found_state)
-
-        for zone in diffusion.zone_list:
-            if zone.state is None:
-                state_counter += 1
-            else:
-                for connected_path in zone.connected_to:
-                    connected_path.set_state(zone.state)
-
-    return state_counter
-
-
-def find_incoherent_states(diffusion, zone_index, zone) -> None:
-    """
-    This function is to find incoherent states while processing the body voltage propagation.
-
-    If the body voltage should pass through a transistor but the left and right substrates are not in the same state,
-    it raises an exception. This methode is helpfully to validate the voltage propagation based on the applied inputs.
-
-    Parameters:
-    -----------
-    diffusion : Diffusion
-        The diffusion part where the searching algorithm is going to be performed.
-
-    zone_index: int
-        The initial start index of the zone the algorthm wants to apply a state
-
-    zone: Zone
-        The zone object with all the properties
-
-    Returns:
-    --------
-    None
-
-    Raises:
-    -------
-    Exception
-        Any state missmatch found between neighbor states
-    """
-
-    if 1 <= zone_index < len(diffusion.zone_list) - 1:
-        left_neighbor_state = diffusion.zone_list[zone_index - 1].state
-        right_neighbor_state = diffusion.zone_list[zone_index + 1].state
-        if left_neighbor_state is not None and right_neighbor_state is not None:
-            if left_neighbor_state != right_neighbor_state:
-                if diffusion.shape_type == ShapeType.NMOS:
-                    state = 0
-                else:
-                    state = 1
-
-                if zone.state is not None and zone.state != state:
-                    Exception("State missmatch")
-
-                else:
-                    zone.set_state(state)
-                    for connected_path in zone.connected_to:
-                        connected_path.set_state(state)
-
-
-def find_neighbor_state(diffusion, zone_index) -> bool:
-    """
-    This function is to find the state applicable to a zone based on physics electronic properties.
-
-    P_MOS diffusion layer: power is passing through poly silicon's zone with a _0_ input
-
-    N_MOS diffusion layer: power is passing through poly silicon's zone with a _1_ input
-
-    This function tries to find the closed known state by going left and right from the initial index position.
-
-    If the zone is between two poly silicons with an "un passing" state, not reflecting state is applied to the zone
-
-    Parameters:
-    -----------
-    diffusion : Diffusion
-        The diffusion part where the searching algorithm is going to be performed.
-
-    zone_index: int
-        The initial start index of the zone the algorthm wants to apply a state
-
-    Returns:
-    --------
-    bool:
-        The found state to be applied to the selected zone.
-
-    Raises:
-    -------
-    Exception
-        Any relevant exceptions that may occur.
-    """
-
-    diffusion_type = diffusion.shape_type
-    zone_list = diffusion.zone_list
-    neighbor_index = [zone_index - 1, zone_index + 1]
-    stop_loop = False
-    found_state = None
-
-    while not stop_loop:
-        for index in range(len(neighbor_index)):
-            if neighbor_index[index] is not None and 0 <= neighbor_index[index] < len(zone_list):
-
-                if index == 0:
-                    next_index = neighbor_index[index] - 1
-                else:
-                    next_index = neighbor_index[index] + 1
-
-                zone = zone_list[neighbor_index[index]]
-
-                if zone.shape_type == ShapeType.POLYSILICON:
-                    if diffusion_type == ShapeType.PMOS and zone.state == 0:
-                        neighbor_index[index] = next_index
-                        continue
-
-                    elif diffusion_type == ShapeType.NMOS and zone.state == 1:
-                        neighbor_index[index] = next_index
-                        continue
-                    else:
-                        neighbor_index[index] = None
-                        continue
-
-                elif zone.state is not None:
-                    found_state = zone.state
-                    stop_loop = True
-                    break
-
-                else:
-                    neighbor_index[index] = next_index
-                    continue
-            else:
-                neighbor_index[index] = None
-                continue
-
-        # If the zone is between two un passing zones, not reflecting state applied
-        if all(x is None for x in neighbor_index):
-            break
+    if via_adjacency is None:
+        via_adjacency = ViaAdjacency(element_list)
+
+    while element is not None:
+        next_element = None
+        for metal in via_adjacency.get_metal_neighbors(element):
+            if metal not in zone.connected_to:
+                next_element = metal
+                zone.set_connected_to(next_element)
+                break
 
-    return found_state
+        element = next_element
@@ -0,0 +1,397 @@
+import numpy as np
+
+from controllers.GDS_Object.attribute import Attribute
+from controllers.GDS_Object.shape import Shape
+from controllers.GDS_Object.type import ShapeType
+
+
+class NetGraph:
+    """
+    Represents the connectivity of the reflective zones of a cell, compiled once at extraction time.
+
+    Every zone and every connected shape (metal, poly silicon) is a node with an integer id. A zone is linked to the
+    shapes of its connected_to list and to its left and right neighbors in its diffusion. The VDD, VSS, input and
+    output shapes are the sources of the propagation, their attributes are resolved once.
+
+    A state is resolved over the integer ids only: the zone states are spread to their shapes, and along the
+    diffusions through the passing transistors (poly silicon at 0 on PMOS, at 1 on NMOS). A transistor between two
+    neighbors of different states is blocking.
+
+    Attributes:
+        shape_list (list[Shape]): The shapes of the graph, indexed by shape id.
+        zone_list (list[Zone]): The zones of the graph, indexed by zone id, grouped by diffusion in the reflection
+            list order.
+        zone_offsets (list[int]): The first zone id of each diffusion, followed by the number of zones.
+        zone_is_poly (list[bool]): True for the poly silicon zones (transistors).
+        zone_passing_state (list[int]): The poly silicon state letting the body voltage through each zone.
+        zone_shapes (list[list[int]]): The shape ids of each zone, in the connected_to order.
+        shape_sources (list[int | Attribute | None]): The state of each VDD (1) and VSS (0) shape, the attribute
+            holding the state of each input and output shape, None for the other shapes.
+
+    Methods:
+        __init__(reflection_list):
+            Compiles the zones and shapes of the reflection list(list[Diffusion]) into the graph.
+
+        propagate():
+            Resolve the state of every zone and shape from the current input and output attribute states.
+
+        propagate_bitsets(attribute_bitsets, lane_number):
+            Resolve the state of every zone for several input vectors at once, one bit per vector.
+
+    Usage:
+        # Creating an instance of the NetGraph class from the reflection list of an extracted cell
+        net_graph = NetGraph(reflection_list)
+        zone_states, shape_states = net_graph.propagate()
+    """
+
+    def __init__(self, reflection_list):
+        self.shape_list = []
+        self.zone_list = []
+        self.zone_offsets = []
+        self.zone_is_poly = []
+        self.zone_passing_state = []
+        self.zone_shapes = []
+
+        shape_ids = {}
+
+        for diffusion in reflection_list:
+            self.zone_offsets.append(len(self.zone_list))
+            # The body voltage passes through a PMOS transistor at 0 and through an NMOS transistor at 1
+            passing_state = 0 if diffusion.shape_type == ShapeType.PMOS else 1
+
+            for zone in diffusion.zone_list:
+                zone_shape_list = []
+                for shape in zone.connected_to:
+                    if id(shape) not in shape_ids:
+                        shape_ids[id(shape)] = len(self.shape_list)
+                        self.shape_list.append(shape)
+
+                    zone_shape_list.append(shape_ids[id(shape)])
+
+                self.zone_list.append(zone)
+                self.zone_is_poly.append(zone.shape_type == ShapeType.POLYSILICON)
+                self.zone_passing_state.append(passing_state)
+                self.zone_shapes.append(zone_shape_list)
+
+        self.zone_offsets.append(len(self.zone_list))
+
+        self.shape_sources = [get_source(shape) for shape in self.shape_list]
+
+    def propagate(self) -> tuple[list, list]:
+        """
+        Resolve the state of every zone and shape from the current input and output attribute states.
+
+        The diffusions are swept in order until the number of unknown zones is stable. The sweep order is kept
+        because it decides the state of the feedback nets (latches, flip-flops).
+
+        Returns:
+        --------
+        tuple[list, list]:
+            The state of each zone and of each shape (0, 1 or None if not reachable), indexed by id.
+
+        Raises:
+        -------
+        ValueError
+            An input or output source without state.
+        """
+        zone_states = [None] * len(self.zone_list)
+        shape_states = [None] * len(self.shape_list)
+
+        # The input and output attributes hold the applied states
+        shape_sources = [source.state if isinstance(source, Attribute) else source for source in self.shape_sources]
+
+        none_counter = 0
+        while True:
+            new_none_counter = self._sweep(zone_states, shape_states, shape_sources)
+            if none_counter == new_none_counter:
+                break
+            none_counter = new_none_counter
+
+        return zone_states, shape_states
+
+    def _sweep(self, zone_states, shape_states, shape_sources) -> int:
+        # One pass over every diffusion, returns the number of unknown zones
+        none_counter = 0
+
+        for diffusion_index in range(len(self.zone_offsets) - 1):
+            start = self.zone_offsets[diffusion_index]
+            stop = self.zone_offsets[diffusion_index + 1]
+
+            # Known states: from the zone shapes or from the first source of the connected_to list
+            for zone_id in range(start, stop):
+                zone_shape_list = self.zone_shapes[zone_id]
+                if zone_states[zone_id] is not None:
+                    self._set_shape_states(shape_states, zone_shape_list, zone_states[zone_id])
+                    continue
+
+                for shape_id in zone_shape_list:
+                    if shape_states[shape_id] is not None:
+                        zone_states[zone_id] = shape_states[shape_id]
+                        self._set_shape_states(shape_states, zone_shape_list, zone_states[zone_id])
+                        break
+
+                    if self.shape_sources[shape_id] is not None:
+                        zone_states[zone_id] = get_valid_state(shape_sources[shape_id])
+                        break
+
+            # Unknown states: from the neighbor zones through the passing transistors
+            for zone_id in range(start, stop):
+                if self.zone_is_poly[zone_id]:
+                    self._set_blocking_state(zone_states, shape_states, zone_id, start, stop)
+
+                elif zone_states[zone_id] is None:
+                    zone_states[zone_id] = self._find_neighbor_state(zone_states, zone_id, start, stop)
+
+            for zone_id in range(start, stop):
+                if zone_states[zone_id] is None:
+                    none_counter += 1
+                else:
+                    self._set_shape_states(shape_states, self.zone_shapes[zone_id], zone_states[zone_id])
+
+        return none_counter
+
+    @staticmethod
+    def _set_shape_states(shape_states, zone_shape_list, state) -> None:
+        for shape_id in zone_shape_list:
+            shape_states[shape_id] = state
+
+    def _set_blocking_state(self, zone_states, shape_states, zone_id, start, stop) -> None:
+        # A transistor between two neighbors of different states is blocking
+        if start < zone_id < stop - 1:
+            left_state = zone_states[zone_id - 1]
+            right_state = zone_states[zone_id + 1]
+            if left_state is not None and right_state is not None and left_state != right_state:
+                state = 1 - self.zone_passing_state[zone_id]
+                if zone_states[zone_id] is None or zone_states[zone_id] == state:
+                    zone_states[zone_id] = state
+                    self._set_shape_states(shape_states, self.zone_shapes[zone_id], state)
+
+    def _find_neighbor_state(self, zone_states, zone_id, start, stop):
+        # Closest known zone on the left or on the right, the left one first at the same distance
+        neighbor_ids = [zone_id - 1, zone_id + 1]
+
+        while neighbor_ids[0] is not None or neighbor_ids[1] is not None:
+            for side, direction in enumerate((-1, 1)):
+                neighbor_id = neighbor_ids[side]
+                if neighbor_id is None:
+                    continue
+
+                if not start <= neighbor_id < stop:
+                    neighbor_ids[side] = None
+
+                elif self.zone_is_poly[neighbor_id]:
+                    passing = zone_states[neighbor_id] == self.zone_passing_state[neighbor_id]
+                    neighbor_ids[side] = neighbor_id + direction if passing else None
+
+                elif zone_states[neighbor_id] is not None:
+                    return zone_states[neighbor_id]
+
+                else:
+                    neighbor_ids[side] = neighbor_id + direction
+
+        return None
+
+    def propagate_bitsets(self, attribute_bitsets, lane_number) -> tuple[list, list, int]:
+        """
+        Resolve the state of every zone for several input vectors at once, one bit per vector (lane).
+
+        The states are bitsets: a known and a value bit of each lane. Every lane follows the sweeps of propagate, the
+        sweeps are repeated until no lane changes. A lane without new zone in a sweep is not changed by the next
+        sweeps, so each lane gets the states of its own propagate call.
+
+        Parameters:
+        -----------
+        attribute_bitsets: dict
+            The (value, valid) bitsets of each input and output attribute, valid is 0 for the lanes without state.
+
+        lane_number: int
+            The number of input vectors.
+
+        Returns:
+        --------
+        tuple[list, list, int]:
+            The known and the value bitset of each zone and the bitset of the failed lanes, where an input or output
+            source without state is used.
+        """
+        lane_mask = (1 << lane_number) - 1
+
+        zone_known = [0] * len(self.zone_list)
+        zone_value = [0] * len(self.zone_list)
+        shape_known = [0] * len(self.shape_list)
+        shape_value = [0] * len(self.shape_list)
+        failed = 0
+
+        shape_sources = []
+        for source in self.shape_sources:
+            if source is None:
+                shape_sources.append(None)
+            elif isinstance(source, Attribute):
+                shape_sources.append(attribute_bitsets.get(source, (0, 0)))
+            else:
+                shape_sources.append((lane_mask if source == 1 else 0, lane_mask))
+
+        def set_shape_states(zone_id, lanes) -> None:
+            lane_value = zone_value[zone_id] & lanes
+            for shape_id in self.zone_shapes[zone_id]:
+                shape_known[shape_id] |= lanes
+                shape_value[shape_id] = (shape_value[shape_id] & ~lanes) | lane_value
+
+        while True:
+            previous_zone_known = list(zone_known)
+
+            for diffusion_index in range(len(self.zone_offsets) - 1):
+                start = self.zone_offsets[diffusion_index]
+                stop = self.zone_offsets[diffusion_index + 1]
+
+                # Known states: from the zone shapes or from the first source of the connected_to list
+                for zone_id in range(start, stop):
+                    if zone_known[zone_id]:
+                        set_shape_states(zone_id, zone_known[zone_id])
+
+                    remaining = lane_mask & ~zone_known[zone_id]
+                    for shape_id in self.zone_shapes[zone_id]:
+                        if not remaining:
+                            break
+
+                        lanes = remaining & shape_known[shape_id]
+                        if lanes:
+                            zone_value[zone_id] |= shape_value[shape_id] & lanes
+                            zone_known[zone_id] |= lanes
+                            set_shape_states(zone_id, lanes)
+                            remaining &= ~lanes
+
+                        if shape_sources[shape_id] is not None:
+                            source_value, source_valid = shape_sources[shape_id]
+                            failed |= remaining & ~source_valid
+                            zone_value[zone_id] |= source_value & remaining
+                            zone_known[zone_id] |= remaining
+                            break
+
+                # Unknown states: from the neighbor zones through the passing transistors
+                for zone_id in range(start, stop):
+                    if self.zone_is_poly[zone_id]:
+                        if start < zone_id < stop - 1:
+                            self._set_blocking_bitsets(zone_known, zone_value, zone_id, lane_mask, set_shape_states)
+
+                    elif lane_mask & ~zone_known[zone_id]:
+                        self._find_neighbor_bitsets(zone_known, zone_value, zone_id, start, stop, lane_mask)
+
+                for zone_id in range(start, stop):
+                    if zone_known[zone_id]:
+                        set_shape_states(zone_id, zone_known[zone_id])
+
+            if previous_zone_known == zone_known:
+                break
+
+        return zone_known, zone_value, failed
+
+    def _set_blocking_bitsets(self, zone_known, zone_value, zone_id, lane_mask, set_shape_states) -> None:
+        # A transistor between two neighbors of different states is blocking, on every lane
+        lanes = zone_known[zone_id - 1] & zone_known[zone_id + 1] & (zone_value[zone_id - 1] ^ zone_value[zone_id + 1])
+        blocking_value = lane_mask if self.zone_passing_state[zone_id] == 0 else 0
+        lanes &= ~zone_known[zone_id] | ~(zone_value[zone_id] ^ blocking_value)
+
+        if lanes:
+            zone_known[zone_id] |= lanes
+            zone_value[zone_id] = (zone_value[zone_id] & ~lanes) | (blocking_value & lanes)
+            set_shape_states(zone_id, lanes)
+
+    def _find_neighbor_bitsets(self, zone_known, zone_value, zone_id, start, stop, lane_mask) -> None:
+        # Closest known zone of each lane on the left or on the right, the left one first at the same distance
+        unknown = lane_mask & ~zone_known[zone_id]
+        searching = [unknown, unknown]
+        distance = 1
+
+        while searching[0] or searching[1]:
+            for side, direction in enumerate((-1, 1)):
+                if not searching[side]:
+                    continue
+
+                neighbor_id = zone_id + direction * distance
+                if not start <= neighbor_id < stop:
+                    searching[side] = 0
+
+                elif self.zone_is_poly[neighbor_id]:
+                    passing_value = 0 if self.zone_passing_state[neighbor_id] == 0 else lane_mask
+                    searching[side] &= zone_known[neighbor_id] & ~(zone_value[neighbor_id] ^ passing_value)
+
+                else:
+                    found = searching[side] & zone_known[neighbor_id]
+                    zone_value[zone_id] |= zone_value[neighbor_id] & found
+                    zone_known[zone_id] |= found
+                    searching[0] &= ~found
+                    searching[1] &= ~found
+
+            distance += 1
+
+
+def pack_lanes(lane_bits) -> int:
+    """
+    Pack one boolean per lane into a bitset, the lane i is the bit i.
+
+    Returns:
+    --------
+    int:
+        The bitset.
+    """
+    lane_bytes = np.packbits(np.asarray(lane_bits, dtype=bool), bitorder='little')
+
+    return int.from_bytes(lane_bytes.tobytes(), 'little')
+
+
+def unpack_lanes(bitset_list, lane_number) -> np.ndarray:
+    """
+    Unpack bitsets into one boolean per lane, as a (bitsets x lanes) matrix.
+
+    Returns:
+    --------
+    np.ndarray:
+        The lane booleans.
+    """
+    byte_number = (lane_number + 7) // 8
+    lane_bytes = np.frombuffer(b''.join(bitset.to_bytes(byte_number, 'little') for bitset in bitset_list),
+                               dtype=np.uint8).reshape(len(bitset_list), byte_number)
+
+    return np.unpackbits(lane_bytes, axis=1, bitorder='little')[:, :lane_number].astype(bool)
+
+
+def get_source(shape):
+    """
+    Get the source of the propagation applied to a shape by its attribute.
+
+    Parameters:
+    -----------
+    shape: Shape
+        A metal or a poly silicon connected to a zone.
+
+    Returns:
+    --------
+    int | Attribute | None:
+        1 for VDD, 0 for VSS, the input or output attribute holding the applied state, None if the shape is not a
+        source.
+    """
+    attribute = shape.attribute
+
+    if isinstance(attribute, Attribute):
+        if attribute.shape_type == ShapeType.VDD:
+            return 1
+        elif attribute.shape_type == ShapeType.VSS:
+            return 0
+        elif attribute.shape_type == ShapeType.OUTPUT or attribute.shape_type == ShapeType.INPUT:
+            return attribute
+
+    # A poly silicon takes the input of the metal it is connected to
+    elif isinstance(attribute, Shape) and isinstance(attribute.attribute, Attribute) \
+            and attribute.attribute.shape_type == ShapeType.INPUT:
+        return attribute.attribute
+
+    return None
+
+
+def get_valid_state(state) -> int:
+    if state is True or state == 1:
+        return 1
+    elif state is False or state == 0:
+        return 0
+    else:
+        raise ValueError("Invalid state input. Please provide a boolean or 0/1.")
@@ -0,0 +1,70 @@
+class PropagationState:
+    """
+    Represents the immutable result of a body voltage propagation for one input combination.
+
+    The geometry is not copied: the state only stores the zone state vector and keeps a reference to the
+    AutoOPSPropagation master it has been computed from, the orientation geometry of the master is shared.
+
+    Attributes:
+        propagation_master (AutoOPSPropagation): The master object holding the cell geometry.
+        name (str): The name of the cell.
+        inputs (dict): The applied inputs values.
+        flip_flop (int): The applied flip-flop output Q (None if not applicable).
+        state_vector (np.ndarray): The int8 state of each zone in the master net graph zone order, -1 if unknown.
+        zone_states (tuple(tuple)): The state of each zone, grouped by diffusion in the master reflection list order.
+
+    Methods:
+        __init__(propagation_master, inputs, flip_flop, state_vector):
+            Initializes a new instance of the PropagationState class.
+
+        iter_zones():
+            Iterate over the (diffusion, zone, state) of every reflective zone of the cell.
+
+        get_width():
+            Get the width of the cell for the composition stage.
+
+        get_height():
+            Get the height of the cell for the composition stage.
+
+        orientation_list:
+            Get the reflective zone geometry of the cell for every orientation (N, FN, E, FE, S, FS, W, FW), indexed
+            as the state vector.
+
+    Usage:
+        # Creating an instance of the PropagationState class from an applied master
+        propagation_master.apply_state({'A': 1})
+        my_state = propagation_master.get_state_result()
+    """
+
+    def __init__(self, propagation_master, inputs, flip_flop, state_vector):
+        self.propagation_master = propagation_master
+        self.name = propagation_master.name
+        self.inputs = dict(inputs)
+        self.flip_flop = flip_flop
+        self.state_vector = state_vector
+
+    @property
+    def zone_states(self) -> tuple[tuple]:
+        zone_offsets = self.propagation_master.net_graph.zone_offsets
+        states = [None if state < 0 else state for state in self.state_vector.tolist()]
+
+        return tuple(tuple(states[zone_offsets[index]:zone_offsets[index + 1]])
+                     for index in range(len(zone_offsets) - 1))
+
+    def iter_zones(self):
+        states = self.state_vector.tolist()
+        zone_index = 0
+        for diffusion in self.propagation_master.reflection_list:
+            for zone in diffusion.zone_list:
+                yield diffusion, zone, None if states[zone_index] < 0 else states[zone_index]
+                zone_index += 1
+
+    def get_width(self) -> float:
+        return self.propagation_master.get_width()
+
+    def get_height(self) -> float:
+        return self.propagation_master.get_height()
+
+    @property
+    def orientation_list(self) -> dict:
+        return self.propagation_master.orientation_list
@@ -0,0 +1,37 @@
+from shapely.strtree import STRtree
+
+from controllers.GDS_Object.shape import Shape
+
+
+class SpatialIndex:
+    """
+    Represents an STRtree over the shapes of a single shape type of a cell.
+
+    The tree is built once per cell so that overlap lookups (via, N well, poly silicon) do not have to scan
+    the whole element list for every shape.
+
+    Attributes:
+        shape_list (list[Shape]): The indexed shapes, in the element list order.
+        tree (STRtree): The Shapely tree built over the shapes polygons.
+
+    Methods:
+        __init__(element_list, shape_type):
+            Builds the tree over every shape of the element list with the provided shape type(ShapeType).
+
+        query(polygon):
+            Get the indexed shapes (list[Shape]) intersecting the polygon, in the element list order.
+
+    Usage:
+        # Creating an instance of the SpatialIndex class
+        via_index = SpatialIndex(element_list, ShapeType.VIA)
+        connected_vias = via_index.query(metal.polygon)
+    """
+
+    def __init__(self, element_list, shape_type):
+        self.shape_list = [element for element in element_list
+                           if isinstance(element, Shape) and element.shape_type == shape_type]
+        self.tree = STRtree([shape.polygon for shape in self.shape_list])
+
+    def query(self, polygon) -> list[Shape]:
+        indexes = sorted(self.tree.query(polygon, predicate="intersects"))
+        return [self.shape_list[index] for index in indexes]
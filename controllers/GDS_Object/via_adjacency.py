@@ -0,0 +1,67 @@
+from shapely.strtree import STRtree
+
+from controllers.GDS_Object.shape import Shape
+from controllers.GDS_Object.type import ShapeType
+
+
+class ViaAdjacency:
+    """
+    Represents the via connectivity of the metal shapes of a cell, built once per cell.
+
+    Every via is mapped to the metal shapes holding it in their connection list, so that the metals sharing a via
+    with a shape are found with dictionary lookups instead of scanning the element list for every hop.
+
+    Attributes:
+        metal_list (list[Shape]): The metal shapes, in the element list order.
+        via_metals (dict): The metal ids (index in metal_list) holding each via, by via object id.
+        level_one_metals (list[int]): The metal id of each first level via of a first level metal.
+        level_one_tree (STRtree): The Shapely tree built over the polygons of these first level vias.
+
+    Methods:
+        __init__(element_list):
+            Builds the adjacency from the connection list of every metal shape of the element list.
+
+        get_metal_neighbors(shape):
+            Get the metal shapes (list[Shape]) sharing a via with the shape, in the element list order.
+
+        query_level_one(polygon):
+            Get the first level metal shapes (list[Shape]) with a first level via intersecting the polygon, in the
+            element list order.
+
+    Usage:
+        # Creating an instance of the ViaAdjacency class once the vias are added to the shapes
+        via_adjacency = ViaAdjacency(element_list)
+        connected_metals = via_adjacency.get_metal_neighbors(poly_shape)
+    """
+
+    def __init__(self, element_list):
+        self.metal_list = [element for element in element_list
+                           if isinstance(element, Shape) and element.shape_type == ShapeType.METAL]
+        self.via_metals = {}
+        self.level_one_metals = []
+
+        level_one_polygons = []
+        for metal_id, metal in enumerate(self.metal_list):
+            for via in metal.connection_list:
+                metal_ids = self.via_metals.setdefault(id(via), [])
+                if not metal_ids or metal_ids[-1] != metal_id:
+                    metal_ids.append(metal_id)
+
+                if metal.layer_level == 1 and via.layer_level == 1:
+                    self.level_one_metals.append(metal_id)
+                    level_one_polygons.append(via.polygon)
+
+        self.level_one_tree = STRtree(level_one_polygons)
+        self._neighbor_cache = {}
+
+    def get_metal_neighbors(self, shape) -> list[Shape]:
+        if id(shape) not in self._neighbor_cache:
+            metal_ids = {metal_id for via in shape.connection_list for metal_id in self.via_metals.get(id(via), [])}
+            self._neighbor_cache[id(shape)] = [self.metal_list[metal_id] for metal_id in sorted(metal_ids)]
+
+        return self._neighbor_cache[id(shape)]
+
+    def query_level_one(self, polygon) -> list[Shape]:
+        indexes = self.level_one_tree.query(polygon, predicate="intersects")
+        metal_ids = {self.level_one_metals[index] for index in indexes}
+        return [self.metal_list[metal_id] for metal_id in sorted(metal_ids)]
@@ -1,77 +1,180 @@
+import math
 import re
 
+DISTANCE_PATTERN = re.compile(r'UNITS\sDISTANCE\sMICRONS\s(\d+)')
+CORE_BOX_PATTERN = re.compile(r'DESIGN\sFE_CORE_BOX_(LL_X|UR_X|LL_Y|UR_Y)\sREAL\s(\d+\.\d+)')
+COMPONENT_PATTERN = re.compile(r'-\s(\w+)\s(\w+)\s\+\sPLACED\s\(\s(\d+)\s(\d+)\s\)\s([A-Z]+)')
 
-def get_gates_info_from_def_file(file_path, patch_size) -> list:
-    with open(file_path, 'r') as file:
-        data = file.read()
 
-    distance_match = re.search(r'UNITS\sDISTANCE\sMICRONS\s(\d+)', data)
-    design_size_match = re.search(
-        r'DESIGN\sFE_CORE_BOX_LL_X\sREAL\s(\d+\.\d+).*?\n\s*DESIGN\sFE_CORE_BOX_UR_X\sREAL\s(\d+\.\d+).*?\n\s*DESIGN\sFE_CORE_BOX_LL_Y\sREAL\s(\d+\.\d+).*?\n\s*DESIGN\sFE_CORE_BOX_UR_Y\sREAL\s(\d+\.\d+)',
-        data)
+def get_gates_info_from_def_file(file_path, patch_size) -> list:
+    """
+    Extract the placed gates of a DEF design and group them by patch.
+
+    The file is read line by line up to the end of the COMPONENTS section: the header gives the distance unit and
+    the core box, and only the COMPONENTS section is matched for the placed gates. The patch of each gate is computed
+    from its coordinates.
+
+    Parameters:
+    -----------
+    file_path: str
+        Path of the DEF design file.
+
+    patch_size: int
+        The patch size in um (20 if None).
+
+    Returns:
+    --------
+    list:
+        The design size, the patches (position and gates by cell name), the cell names list and the number of
+        patches along x and y.
+
+    Raises:
+    -------
+    Exception: If the distance unit or the core box is missing.
+    """
+    distance_micron = None
+    core_box = {}
 
     dif_size = {}
     gate_dict = {}
     cell_list = []
+    cell_set = set()
 
-    if design_size_match and distance_match:
-        distance_micron = int(distance_match.group(1))
-        dif_size["micron"] = distance_micron
-
-        ll_x = float(design_size_match.group(1))
-        ur_x = float(design_size_match.group(2))
-        ll_y = float(design_size_match.group(3))
-        ur_y = float(design_size_match.group(4))
-
-        dif_size["ur_x"] = ur_x
-        dif_size["ll_x"] = ll_x
-        dif_size["ur_y"] = ur_y
-        dif_size["ll_y"] = ll_y
-
-        # 20um * 20um
-        if patch_size is None:
-            patch_size = 20
-
-        dif_size["patch_size"] = patch_size
-
-        width_patch = int((ur_x-ll_x) / patch_size) + 1
-        height_patch = int((ur_y-ll_y) / patch_size) + 1
-
-        patch_counter = 0
-
-        for i in range(0, height_patch):
-            position_y = ll_y + i * patch_size
-            for j in range(0, width_patch):
-                position_x = ll_x + j * patch_size
-                gate_dict[patch_counter] = {'position_x': position_x, 'position_y': position_y, 'gates': {}}
-                patch_counter += 1
-
-        components = re.findall(r'-\s(\w+)\s(\w+)\s\+\sPLACED\s\(\s(\d+)\s(\d+)\s\)\s([A-Z]+)', data)
-
-        for component in components:
-            gate_id = component[0]
-            gate_name = component[1]
-            x_coord = int(component[2])/distance_micron
-            y_coord = int(component[3])/distance_micron
-            orientation = component[4]
-
-            if gate_name not in cell_list:
-                cell_list.append(gate_name)
-
-            for patch_key in gate_dict:
-                patch = gate_dict[patch_key]
-                if patch['position_x'] <= x_coord < patch['position_x'] + patch_size and \
-                        patch['position_y'] <= y_coord < patch['position_y'] + patch_size:
-
-                    if gate_name in patch['gates']:
-                        patch['gates'][gate_name].append(
-                            {'GateID': gate_id, 'Coordinates': (x_coord, y_coord), 'Orientation': orientation})
-                    else:
-                        patch['gates'][gate_name] = [
-                            {'GateID': gate_id, 'Coordinates': (x_coord, y_coord), 'Orientation': orientation}]
-    else:
-        raise Exception("Def file reading error, check file or format")
+    width_patch = 0
+    height_patch = 0
+
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.lstrip().startswith("COMPONENTS "):
+                dif_size, gate_dict, width_patch, height_patch = init_patches(distance_micron, core_box, patch_size)
+                patch_size = dif_size["patch_size"]
+
+                # Only the COMPONENTS section is kept in memory, a component can span several lines
+                component_lines = []
+                for component_line in file:
+                    if component_line.lstrip().startswith("END COMPONENTS"):
+                        break
+                    component_lines.append(component_line)
+
+                for component in COMPONENT_PATTERN.finditer("".join(component_lines)):
+                    add_component(component.groups(), distance_micron, patch_size, dif_size, gate_dict,
+                                  width_patch, height_patch, cell_list, cell_set)
+
+                # The pins, nets and routing sections are not used
+                break
+
+            elif distance_micron is None and "UNITS" in line:
+                distance_match = DISTANCE_PATTERN.search(line)
+                if distance_match:
+                    distance_micron = int(distance_match.group(1))
+
+            elif "FE_CORE_BOX_" in line:
+                core_box_match = CORE_BOX_PATTERN.search(line)
+                if core_box_match:
+                    core_box[core_box_match.group(1)] = float(core_box_match.group(2))
+
+    if not dif_size:
+        dif_size, gate_dict, width_patch, height_patch = init_patches(distance_micron, core_box, patch_size)
 
     def_extraction = [dif_size, gate_dict, cell_list, [width_patch, height_patch]]
 
     return def_extraction
+
+
+def init_patches(distance_micron, core_box, patch_size) -> tuple[dict, dict, int, int]:
+    """
+    Build the empty patches covering the core box of the design.
+
+    Parameters:
+    -----------
+    distance_micron: int
+        The number of DEF units per micron.
+
+    core_box: dict
+        The LL_X, UR_X, LL_Y and UR_Y coordinates of the core box in um.
+
+    patch_size: int
+        The patch size in um (20 if None).
+
+    Returns:
+    --------
+    tuple[dict, dict, int, int]:
+        The design size, the patches and the number of patches along x and y.
+
+    Raises:
+    -------
+    Exception: If the distance unit or the core box is missing.
+    """
+    if distance_micron is None or len(core_box) != 4:
+        raise Exception("Def file reading error, check file or format")
+
+    dif_size = {"micron": distance_micron, "ur_x": core_box["UR_X"], "ll_x": core_box["LL_X"],
+                "ur_y": core_box["UR_Y"], "ll_y": core_box["LL_Y"]}
+
+    # 20um * 20um
+    if patch_size is None:
+        patch_size = 20
+
+    dif_size["patch_size"] = patch_size
+
+    width_patch = int((dif_size["ur_x"] - dif_size["ll_x"]) / patch_size) + 1
+    height_patch = int((dif_size["ur_y"] - dif_size["ll_y"]) / patch_size) + 1
+
+    gate_dict = {}
+    patch_counter = 0
+
+    for i in range(0, height_patch):
+        position_y = dif_size["ll_y"] + i * patch_size
+        for j in range(0, width_patch):
+            position_x = dif_size["ll_x"] + j * patch_size
+            gate_dict[patch_counter] = {'position_x': position_x, 'position_y': position_y, 'gates': {}}
+            patch_counter += 1
+
+    return dif_size, gate_dict, width_patch, height_patch
+
+
+def add_component(component, distance_micron, patch_size, dif_size, gate_dict, width_patch, height_patch, cell_list,
+                  cell_set) -> None:
+    """
+    Add a placed gate to the patch containing it.
+
+    The patch row and column are computed from the coordinates. The neighbouring rows and columns are checked with
+    the patch bounds too, so that a gate on a patch border is binned as with a scan of every patch.
+
+    Parameters:
+    -----------
+    component: tuple(str)
+        The gate id, the cell name, the x and y coordinates in DEF units and the orientation.
+
+    Returns:
+    --------
+    None
+    """
+    gate_id, gate_name, x_coord, y_coord, orientation = component
+    x_coord = int(x_coord) / distance_micron
+    y_coord = int(y_coord) / distance_micron
+
+    if gate_name not in cell_set:
+        cell_set.add(gate_name)
+        cell_list.append(gate_name)
+
+    # The patch bounds only depend on the column along x and on the row along y
+    column = math.floor((x_coord - dif_size["ll_x"]) / patch_size)
+    column_list = [j for j in (column - 1, column, column + 1) if 0 <= j < width_patch and
+                   gate_dict[j]['position_x'] <= x_coord < gate_dict[j]['position_x'] + patch_size]
+    if not column_list:
+        return
+
+    row = math.floor((y_coord - dif_size["ll_y"]) / patch_size)
+    row_list = [i for i in (row - 1, row, row + 1) if 0 <= i < height_patch and
+                gate_dict[i * width_patch]['position_y'] <= y_coord < gate_dict[i * width_patch]['position_y'] + patch_size]
+
+    for i in row_list:
+        for j in column_list:
+            patch = gate_dict[i * width_patch + j]
+            if gate_name in patch['gates']:
+                patch['gates'][gate_name].append(
+                    {'GateID': gate_id, 'Coordinates': (x_coord, y_coord), 'Orientation': orientation})
+            else:
+                patch['gates'][gate_name] = [
+                    {'GateID': gate_id, 'Coordinates': (x_coord, y_coord), 'Orientation': orientation}]
@@ -0,0 +1,198 @@
+import numpy as np
+from scipy import fft
+
+
+# The cached PSF spectra are dropped, oldest first, above this size in bytes
+PSF_FFT_CACHE_BYTES = 512 * 2 ** 20
+
+
+class EOFMEngine:
+    """
+    FFT convolution of a layout matrix with a PSF, the spectrum of each PSF is computed once and cached.
+
+    Only the bounding box of the non-zero layout is transformed and the result is computed on this bounding box
+    extended by the PSF support, the rest of the image is zero. The real FFTs run on every core.
+
+    Args:
+        dtype (np.dtype): The float type of the computation, float32 halves the memory and the FFT time.
+        workers (int): The number of FFT workers, -1 to use every core.
+        cache_bytes (int): The maximum size of the cached PSF spectra.
+
+    Attributes:
+        dtype (np.dtype): The float type of the computation.
+        workers (int): The number of FFT workers.
+        cache_bytes (int): The maximum size of the cached PSF spectra.
+        psf_fft_cache (dict): The PSF spectra by PSF key, FFT shape and float type, in insertion order.
+
+    Example usage:
+        >>> engine = EOFMEngine(dtype=np.float32)
+        >>> R = engine.convolve(layout, psf_key, kernel.shape, (radius, radius), lambda: kernel)
+    """
+
+    def __init__(self, dtype=np.float64, workers=-1, cache_bytes=PSF_FFT_CACHE_BYTES):
+        self.dtype = dtype
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self.psf_fft_cache = {}
+
+    def convolve(self, simulation_object, psf_key, psf_shape, psf_offset, psf_factory) -> np.ndarray:
+        """
+        Convolve a layout matrix with a PSF, the result has the shape of the layout.
+
+        The result at (i, j) is the full convolution at (i + psf_offset[0], j + psf_offset[1]), the offset of the
+        PSF center gives a centered convolution.
+
+        Parameters:
+        -----------
+        simulation_object: np.ndarray
+            The layout matrix.
+
+        psf_key: tuple
+            The parameters identifying the PSF.
+
+        psf_shape: tuple[int, int]
+            The shape of the PSF.
+
+        psf_offset: tuple[int, int]
+            The offset between the result and the full convolution along each axis.
+
+        psf_factory: callable
+            Build the PSF, only called when its spectrum is not cached.
+
+        Returns:
+        --------
+        np.ndarray:
+            The convolved matrix.
+        """
+        simulation_object = np.asarray(simulation_object)
+        result = np.zeros(simulation_object.shape, dtype=self.dtype)
+
+        rows = np.flatnonzero(simulation_object.any(axis=1))
+        if rows.size == 0:
+            return result
+        columns = np.flatnonzero(simulation_object.any(axis=0))
+
+        start = (rows[0], columns[0])
+        stop = (rows[-1] + 1, columns[-1] + 1)
+        layout = simulation_object[start[0]:stop[0], start[1]:stop[1]]
+
+        fft_shape = tuple(fft.next_fast_len(layout.shape[axis] + psf_shape[axis] - 1, real=True) for axis in range(2))
+
+        layout_fft = fft.rfft2(layout.astype(self.dtype, copy=False), fft_shape, workers=self.workers)
+        layout_fft *= self.get_psf_fft(psf_key, fft_shape, psf_factory)
+        full = fft.irfft2(layout_fft, fft_shape, workers=self.workers)
+
+        # The full convolution is zero out of the bounding box extended by the PSF support
+        windows = [get_convolution_window(start[axis], stop[axis], psf_shape[axis], psf_offset[axis],
+                                          simulation_object.shape[axis]) for axis in range(2)]
+
+        result[windows[0][0], windows[1][0]] = full[windows[0][1], windows[1][1]]
+
+        return result
+
+    def convolve_separable(self, simulation_object, row_psf, column_psf, psf_offset) -> np.ndarray:
+        """
+        Convolve a layout matrix with a separable PSF, the outer product of a row and a column profile.
+
+        The columns and then the rows of the layout bounding box are convolved with 1-D FFTs, the 2-D PSF is never
+        built.
+
+        Parameters:
+        -----------
+        simulation_object: np.ndarray
+            The layout matrix.
+
+        row_psf: np.ndarray
+            The PSF profile along the rows (first axis).
+
+        column_psf: np.ndarray
+            The PSF profile along the columns (second axis).
+
+        psf_offset: tuple[int, int]
+            The offset between the result and the full convolution along each axis.
+
+        Returns:
+        --------
+        np.ndarray:
+            The convolved matrix.
+        """
+        simulation_object = np.asarray(simulation_object)
+        result = np.zeros(simulation_object.shape, dtype=self.dtype)
+
+        rows = np.flatnonzero(simulation_object.any(axis=1))
+        if rows.size == 0:
+            return result
+        columns = np.flatnonzero(simulation_object.any(axis=0))
+
+        layout = simulation_object[rows[0]:rows[-1] + 1, columns[0]:columns[-1] + 1].astype(self.dtype, copy=False)
+
+        row_window = get_convolution_window(rows[0], rows[-1] + 1, len(row_psf), psf_offset[0],
+                                            simulation_object.shape[0])
+        column_window = get_convolution_window(columns[0], columns[-1] + 1, len(column_psf), psf_offset[1],
+                                               simulation_object.shape[1])
+
+        # Only the result rows are kept before convolving along the second axis
+        layout = self.convolve_axis(layout, row_psf, 0)[row_window[1]]
+        result[row_window[0], column_window[0]] = self.convolve_axis(layout, column_psf, 1)[:, column_window[1]]
+
+        return result
+
+    def convolve_axis(self, matrix, psf, axis) -> np.ndarray:
+        """
+        Full convolution of every line of a matrix with a 1-D PSF along an axis.
+
+        Returns:
+        --------
+        np.ndarray:
+            The convolved matrix, longer by the PSF length minus one along the axis.
+        """
+        size = matrix.shape[axis] + len(psf) - 1
+        fft_size = fft.next_fast_len(size, real=True)
+
+        psf_fft = fft.rfft(np.asarray(psf, dtype=self.dtype), fft_size)
+        matrix_fft = fft.rfft(matrix, fft_size, axis=axis, workers=self.workers)
+        matrix_fft *= psf_fft[:, np.newaxis] if axis == 0 else psf_fft
+
+        full = fft.irfft(matrix_fft, fft_size, axis=axis, workers=self.workers)
+
+        return full[:size] if axis == 0 else full[:, :size]
+
+    def get_psf_fft(self, psf_key, fft_shape, psf_factory) -> np.ndarray:
+        """
+        Get the real FFT of a PSF zero-padded to the FFT shape, computed once and cached.
+
+        Returns:
+        --------
+        np.ndarray:
+            The PSF spectrum.
+        """
+        key = (psf_key, fft_shape, np.dtype(self.dtype).str)
+
+        if key not in self.psf_fft_cache:
+            psf = np.asarray(psf_factory(), dtype=self.dtype)
+            self.psf_fft_cache[key] = fft.rfft2(psf, fft_shape, workers=self.workers)
+
+            # The oldest spectra are dropped, the new one is always kept
+            cache_size = sum(psf_fft.nbytes for psf_fft in self.psf_fft_cache.values())
+            while cache_size > self.cache_bytes and len(self.psf_fft_cache) > 1:
+                oldest_key = next(iter(self.psf_fft_cache))
+                cache_size -= self.psf_fft_cache.pop(oldest_key).nbytes
+
+        return self.psf_fft_cache[key]
+
+
+def get_convolution_window(start, stop, psf_size, psf_offset, size) -> tuple[slice, slice]:
+    """
+    Get the result window of a convolution along an axis and the matching window of the full convolution.
+
+    The layout is non-zero from start to stop, the full convolution is computed from start.
+
+    Returns:
+    --------
+    tuple[slice, slice]:
+        The result window and the full convolution window.
+    """
+    result_start = max(start - psf_offset, 0)
+    result_stop = max(min(stop + psf_size - 1 - psf_offset, size), result_start)
+
+    return slice(result_start, result_stop), slice(result_start + psf_offset - start, result_stop + psf_offset - start)
@@ -14,6 +14,7 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from controllers.GDS_Object.type import ShapeType
+from controllers.lib_reader import input_pattern_index
 
 
 def plot_elements(propagation_object) -> None:
@@ -204,21 +205,18 @@ def benchmark(object_list, def_extract, plot, vpi_extraction=None) -> None:
                         key = list(object_list[cell_name].keys())[0]
                         propagation_object = object_list[cell_name][key]
 
-                    for zone in propagation_object.orientation_list[position['Orientation']]:
-                        x, y = zone["coords"]
-                        x_adder, y_adder = position['Coordinates']
+                    geometry = propagation_object.orientation_list[position['Orientation']]
+                    x_adder, y_adder = position['Coordinates']
+
+                    for (x, y), is_pmos, state in zip(geometry['coords'], geometry['is_pmos'],
+                                                      propagation_object.state_vector):
                         x = tuple([element + x_adder for element in x])
                         y = tuple([element + y_adder for element in y])
 
-                        state = zone["state"]
-
-                        if zone["diff_type"] == ShapeType.PMOS:
-                            if state is None:
-                                reflect = False
-                            else:
-                                reflect = not state
+                        if is_pmos:
+                            reflect = state == 0
                         else:
-                            reflect = state
+                            reflect = state == 1
                         if bool(reflect) and plot:
                             plt.fill(x, y, facecolor='white', alpha=1)
 
@@ -273,16 +271,12 @@ def test_orientation(propagation_object):
     orientation_list = ["N", "FN", "E", "FE", "S", "FS", "W", "FW"]
     # orientation_list = ["S", "FS"]
     for orientation in orientation_list:
-        for zone in propagation_object.orientation_list[orientation]:
-            x, y = zone["coords"]
-            state = zone["state"]
-            if zone["diff_type"] == ShapeType.PMOS:
-                if state is None:
-                    reflect = False
-                else:
-                    reflect = not state
+        geometry = propagation_object.orientation_list[orientation]
+        for (x, y), is_pmos, state in zip(geometry['coords'], geometry['is_pmos'], propagation_object.state_vector):
+            if is_pmos:
+                reflect = state == 0
             else:
-                reflect = state
+                reflect = state == 1
 
             if bool(reflect):
                 plt.fill(x, y, facecolor="black", alpha=1, edgecolor='grey', linewidth=1)
@@ -393,21 +387,20 @@ def export_reflection_to_png_over_gds_cell(propagation_object, reflection_draw=F
 
         elif isinstance(element, Label):
             if element.name in propagation_object.truthtable.keys():
-                for outputs in propagation_object.truthtable:
-                    for truthtable_inputs, output in propagation_object.truthtable[outputs]:
-                        if element.name in output and truthtable_inputs == propagation_object.inputs:
-                            if any("CK" in name or "RESET" in name or "GATE" in name or "CLK" in name for name in
-                                   list(propagation_object.inputs.keys())) or "Q" in outputs:
-                                if "N" in str(element.name):
-                                    # if None this will be 1 and the else 0
-                                    value = int(bool(not flip_flop))
-                                else:
-                                    value = int(bool(flip_flop))
-                                text = str(element.name) + " = " + str(value)
-                            else:
-                                text = str(element.name) + " = " + str(int(output[element.name]))
-                            edge_color = 'lightblue'
-                            background_color = (228 / 255, 239 / 255, 255 / 255)
+                pattern_index = input_pattern_index(propagation_object.inputs, propagation_object.inputs_list)
+                if pattern_index is not None:
+                    output_truth_table = propagation_object.truthtable[element.name]
+                    if output_truth_table is None:
+                        if "N" in str(element.name):
+                            # if None this will be 1 and the else 0
+                            value = int(bool(not flip_flop))
+                        else:
+                            value = int(bool(flip_flop))
+                        text = str(element.name) + " = " + str(value)
+                    else:
+                        text = str(element.name) + " = " + str(int(output_truth_table[pattern_index]))
+                    edge_color = 'lightblue'
+                    background_color = (228 / 255, 239 / 255, 255 / 255)
 
             elif element.name in propagation_object.inputs.keys():
                 text = str(element.name) + " = " + str(int(propagation_object.inputs[element.name]))
@@ -498,32 +491,29 @@ def unit_test(processed_cells, unit_test_technology):
         for state_index, state in enumerate(states_list):
             zone_counter = 0
 
-            if len(state.reflection_list) == 0:
+            if len(state.zone_states) == 0:
                 # to ignore fill and antenna cells
                 if "fill" not in cell_name.lower() and "antenna" not in cell_name.lower():
                     reflection_list = False
                     continue
 
-            for ref_index, reflection in enumerate(state.reflection_list):
-                for zone_index, zone in enumerate(reflection.zone_list):
-                    coordinates = [(x, y) for x, y in zip(*zone.coordinates)]
-                    zone_type = str(zone.shape_type)
-                    zone_state = zone.state
-
-                    if (
-                            cell_name in ref_data
-                            and state_index < len(ref_data[cell_name])
-                            and zone_counter < len(ref_data[cell_name][state_index])
-                            and 'state' in ref_data[cell_name][state_index][zone_counter]
-                            and 'type' in ref_data[cell_name][state_index][zone_counter]
-                            and (
-                            ref_data[cell_name][state_index][zone_counter]['state'] != zone_state
-                            or ref_data[cell_name][state_index][zone_counter]['type'] != zone_type
-                    )
-                    ):
-                        differences_found = True
-
-                    zone_counter += 1
+            for reflection, zone, zone_state in state.iter_zones():
+                zone_type = str(zone.shape_type)
+
+                if (
+                        cell_name in ref_data
+                        and state_index < len(ref_data[cell_name])
+                        and zone_counter < len(ref_data[cell_name][state_index])
+                        and 'state' in ref_data[cell_name][state_index][zone_counter]
+                        and 'type' in ref_data[cell_name][state_index][zone_counter]
+                        and (
+                        ref_data[cell_name][state_index][zone_counter]['state'] != zone_state
+                        or ref_data[cell_name][state_index][zone_counter]['type'] != zone_type
+                )
+                ):
+                    differences_found = True
+
+                zone_counter += 1
 
         if not reflection_list:
             print(
@@ -557,12 +547,10 @@ def unit_test_generator(processed_cells):
         json_test[cell_name] = []
         for state_index, state in enumerate(states_list):
             state_data = []
-            for reflection in state.reflection_list:
-                for zone in reflection.zone_list:
-                    coordinates = [(x, y) for x, y in zip(*zone.coordinates)]
-                    zone_type = str(zone.shape_type)
-                    zone_state = zone.state
-                    state_data.append({'type': zone_type, 'state': zone_state, 'coordinates': coordinates})
+            for reflection, zone, zone_state in state.iter_zones():
+                coordinates = [(x, y) for x, y in zip(*zone.coordinates)]
+                zone_type = str(zone.shape_type)
+                state_data.append({'type': zone_type, 'state': zone_state, 'coordinates': coordinates})
             json_test[cell_name].append(state_data)
 
     with open('test/tmp.json', 'w') as json_file:
@@ -102,6 +102,34 @@ def update_variable(obj, prompt):
         print("Invalid input format. Please use 'variable value'.")
 
 
+def parse_scan_range(text) -> list[int]:
+    """
+    Parse a start:stop:step range of positions, the stop position is included.
+
+    Parameters:
+    -----------
+    text: str
+        The range as start:stop:step, the step is 1 if omitted.
+
+    Returns:
+    --------
+    list[int]:
+        The positions of the range.
+
+    Raises:
+    -------
+    ValueError: If the range is not made of integers or if the step is not positive.
+    """
+    bounds = [int(bound) for bound in text.split(':')]
+    if len(bounds) == 2:
+        bounds.append(1)
+    if len(bounds) != 3 or bounds[2] <= 0:
+        raise ValueError(f"Invalid range {text}")
+
+    start, stop, step = bounds
+    return list(range(start, stop + 1, step))
+
+
 def plot(image, obj, prompt):
     try:
         if prompt == "psf":
@@ -1,20 +1,43 @@
-import itertools
+import json
+import os
 import re
 
+import numpy as np
 from liberty.parser import parse_liberty
 from liberty.types import *
 
 
+# Increase when the index format changes to rebuild the stored indexes
+LIB_INDEX_VERSION = 1
+
+# The cells index is stored next to the Liberty file with this suffix
+LIB_INDEX_SUFFIX = ".auto_ops_index.json"
+
+# Strings and comments are matched as a whole so that the braces they contain are ignored
+LIBERTY_TOKEN_PATTERN = re.compile(rb'"(?:\\.|[^"\\])*"|/\*.*?\*/|[{}]', re.DOTALL)
+LIBERTY_GROUP_HEADER_PATTERN = re.compile(rb'(\w+)\s*\(\s*"?([^")]*?)"?\s*\)\s*$')
+
+# Groups of a cell used by Auto-OPS, every other group (timing, power, ff, ...) is dropped before parsing
+CELL_KEPT_GROUPS = (b"pin", b"pg_pin")
+
+
 class LibReader:
     """
     The `LibReader` class is designed to extract truth tables from a library (.lib) file,
     automatically identifying input and output names based on the provided gate name.
 
+    The Liberty file is not parsed as a whole: a pre-scan indexes the byte range of every cell group and only the
+    requested cells are parsed, without their timing and power tables. The index is stored next to the Liberty
+    file and the extracted cells are memoized.
+
     Args:
         lib_file_path (str): The path to the library file (.lib) containing gate definitions.
+        store_index (bool): Store the cells index next to the Liberty file to skip the pre-scan of the next runs.
 
     Attributes:
-        lib_file: Liberty object
+        lib_file_path (str): The path to the library file.
+        cell_index (dict{str: tuple[int, int]}): The start and end byte offsets of each cell group.
+        cell_cache (dict): The memoized extract_truth_table results by cell name.
 
     Methods:
         extract_truth_table(gate_name):
@@ -26,20 +49,27 @@ class LibReader:
         >>> print(output_truth_table)
     """
 
-    def __init__(self, lib_file_path):
-        self.lib_file = parse_liberty(open(lib_file_path).read())
+    def __init__(self, lib_file_path, store_index=True):
+        self.lib_file_path = lib_file_path
+        self.cell_index = load_cell_index(lib_file_path, store_index)
+        self.cell_cache = {}
 
-    def extract_truth_table(self, gate_name) -> tuple[dict[Any, list], list[dict[str, Any]], list[Any], bool]:
+    def extract_truth_table(self, gate_name) -> tuple[dict[Any, np.ndarray], list[dict[str, Any]], list[Any], bool]:
         """
         Extracts the truth table for the specified gate from the library file.
 
         Returns:
-            dict: A dictionary representing the truth table, where input patterns (as binary strings)
-            are mapped to their corresponding output values (0 or 1).
+            dict: A dictionary representing the truth table, where each output name is mapped to a boolean array
+            indexed by the input pattern integer (see input_pattern_index), or None for a flip-flop output.
+
+        Raises:
+            KeyError: If the cell is not in the library file.
         """
+        if gate_name in self.cell_cache:
+            return self.cell_cache[gate_name]
 
         # Find the cell (gate) with the specified name
-        cell = select_cell(self.lib_file, gate_name)
+        cell = self.read_cell(gate_name)
 
         voltage = []
 
@@ -61,58 +91,377 @@ class LibReader:
                 input_names.append(pin_name)
 
         output_truth_table = {}
+        is_flip_flop = False
         for output_key in output_function:
-            output_truth_table[output_key], is_flip_flop = calculateOutputFunction(output_function[output_key],
-                                                                                   output_key,
-                                                                                   input_names)
+            output_truth_table[output_key], is_output_flip_flop = calculateOutputFunction(output_function[output_key],
+                                                                                          output_key,
+                                                                                          input_names)
+            is_flip_flop = is_flip_flop or is_output_flip_flop
+
+        self.cell_cache[gate_name] = output_truth_table, voltage, input_names, is_flip_flop
+
+        return self.cell_cache[gate_name]
+
+    def read_cell(self, gate_name):
+        """
+        Parse the group of a cell, keeping only its pins and power pins.
 
-        return output_truth_table, voltage, input_names, is_flip_flop
+        Returns:
+            Group: The parsed Liberty cell group.
+
+        Raises:
+            KeyError: If the cell is not in the library file.
+        """
+        if gate_name not in self.cell_index:
+            raise KeyError("Cell name must be one of: {}".format(list(sorted(self.cell_index.keys()))))
 
+        start, end = self.cell_index[gate_name]
+        with open(self.lib_file_path, 'rb') as lib_file:
+            lib_file.seek(start)
+            cell_data = lib_file.read(end - start)
 
-def calculateOutputFunction(function, pin_name, input_names) -> list:
-    is_flip_flop = False
+        return parse_liberty(prune_cell_group(cell_data).decode('utf-8', errors='replace'))
+
+
+def load_cell_index(lib_file_path, store_index=True) -> dict:
+    """
+    Load the cells index of a Liberty file from its stored index, or build it and store it.
+
+    The stored index is used only if it has been built from a file of the same size and modification time.
+
+    Parameters:
+    -----------
+    lib_file_path: str
+        The path to the library file.
+
+    store_index: bool
+        Read and write the index stored next to the library file.
+
+    Returns:
+    --------
+    dict{str: tuple[int, int]}:
+        The start and end byte offsets of each cell group.
+    """
+    lib_file_stat = os.stat(lib_file_path)
+    index_path = lib_file_path + LIB_INDEX_SUFFIX
+    index_key = [LIB_INDEX_VERSION, lib_file_stat.st_size, lib_file_stat.st_mtime_ns]
 
-    if any("CK" in name or "RESET" in name or "GATE" in name or "CLK" in name for name in
-           input_names) or "Q" in pin_name:
-        input_symbols = input_names
-        is_flip_flop = True
+    if store_index and os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as index_file:
+                stored_index = json.load(index_file)
+            if stored_index['key'] == index_key:
+                return {cell_name: tuple(offsets) for cell_name, offsets in stored_index['cells'].items()}
+        except (OSError, ValueError, KeyError):
+            # An unreadable index is built again
+            pass
 
-    else:
-        input_symbols = re.findall(r'\w+', function)
+    with open(lib_file_path, 'rb') as lib_file:
+        cell_index = build_cell_index(lib_file.read())
 
-    input_symbols = sorted(set(input_symbols))
+    if store_index:
+        try:
+            temporary_path = index_path + "." + str(os.getpid()) + ".tmp"
+            with open(temporary_path, 'w') as index_file:
+                json.dump({'key': index_key, 'cells': cell_index}, index_file)
+            os.replace(temporary_path, index_path)
+        except OSError:
+            # The library directory can be read-only, the index is then built on every run
+            pass
 
-    input_combinations = list(itertools.product([True, False], repeat=len(input_symbols)))
+    return cell_index
 
-    truth_table = []
 
-    for inputs in input_combinations:
-        input_values = {symbol: value for symbol, value in zip(input_symbols, inputs)}
+def build_cell_index(lib_data) -> dict:
+    """
+    Scan a Liberty file for the byte range of every cell group of the library.
+
+    Parameters:
+    -----------
+    lib_data: bytes
+        The content of the library file.
+
+    Returns:
+    --------
+    dict{str: tuple[int, int]}:
+        The start and end byte offsets of each cell group, from the cell keyword to its closing brace.
+    """
+    cell_index = {}
+    depth = 0
+    cell_name = None
+    cell_start = 0
+
+    for token in LIBERTY_TOKEN_PATTERN.finditer(lib_data):
+        if token.group() == b"{":
+            depth += 1
+            if depth == 2:
+                header = LIBERTY_GROUP_HEADER_PATTERN.search(lib_data, max(0, token.start() - 256), token.start())
+                if header is not None and header.group(1) == b"cell":
+                    cell_name = header.group(2).strip().decode('utf-8', errors='replace')
+                    cell_start = header.start()
+
+        elif token.group() == b"}":
+            if depth == 2 and cell_name is not None:
+                cell_index[cell_name] = (cell_start, token.end())
+                cell_name = None
+            depth -= 1
+
+    return cell_index
+
+
+def prune_cell_group(cell_data) -> bytes:
+    """
+    Remove every group of a cell which is not used by Auto-OPS.
+
+    The pin and pg_pin groups are kept without their nested groups (timing, internal_power, ...), so that the
+    parsed cell only holds the pins attributes.
+
+    Parameters:
+    -----------
+    cell_data: bytes
+        The cell group, from the cell keyword to its closing brace.
+
+    Returns:
+    --------
+    bytes:
+        The pruned cell group.
+    """
+    kept_data = []
+    depth = 0
+    kept_start = 0
+    skipped_depth = None
+
+    for token in LIBERTY_TOKEN_PATTERN.finditer(cell_data):
+        if token.group() == b"{":
+            depth += 1
+            if skipped_depth is None and depth >= 2:
+                header = LIBERTY_GROUP_HEADER_PATTERN.search(cell_data, max(0, token.start() - 256), token.start())
+                if header is None:
+                    continue
+                if depth > 2 or header.group(1) not in CELL_KEPT_GROUPS:
+                    kept_data.append(cell_data[kept_start:header.start()])
+                    skipped_depth = depth
+
+        elif token.group() == b"}":
+            if skipped_depth == depth:
+                kept_start = token.end()
+                skipped_depth = None
+            depth -= 1
+
+    kept_data.append(cell_data[kept_start:])
+
+    return b"".join(kept_data)
+
+
+def calculateOutputFunction(function, pin_name, input_names) -> tuple[np.ndarray, bool]:
+    """
+    Compute the truth table of an output pin from its Liberty function.
 
-        if any("CK" in name or "RESET" in name or "GATE" in name or "CLK" in name for name in
-               input_names) or "Q" in pin_name:
-            truth_table.append((input_values, {pin_name: None}))
+    The function is parsed once and evaluated over every input combination at once with NumPy boolean vectors.
 
-        else:
-            eval_expression = function
+    Parameters:
+    -----------
+    function: str
+        The Liberty function of the output pin (ex: "!(A1*A2)").
 
-            for symbol, value in input_values.items():
-                eval_expression = eval_expression.replace(symbol, str(value))
+    pin_name: str
+        The name of the output pin.
 
-            eval_expression = eval_expression.replace('"', '')
-            eval_expression = parse_boolean_function(eval_expression)
-            eval_expression = str(format_boolean_function(eval_expression))
-            eval_expression = eval_expression.replace("!", " not ").replace("&", " and ").replace("*",
-                                                                                                  " and ").replace(
-                "+", " or ")
-            result = eval(eval_expression)
-            # Hot fix problem of xor
-            if result == 0 or result == 1:
-                result = bool(result)
+    input_names: list(str)
+        The inputs names of the cell, the first input is the most significant bit of the input pattern.
 
-            if not isinstance(result, bool):
-                raise ValueError("Truthtable result is not of type bool")
+    Returns:
+    --------
+    tuple[np.ndarray, bool]:
+        The output values indexed by the input pattern integer (None for a flip-flop output, its value depends on
+        the stored state) and True if the output is a flip-flop output.
+
+    Raises:
+    -------
+    ValueError: If the function is not a valid Liberty function or uses a pin which is not an input of the cell.
+    """
+    if is_flip_flop_output(pin_name, input_names):
+        return None, True
+
+    function_tree = parse_function(function)
+
+    input_number = len(input_names)
+    patterns = np.arange(1 << input_number)
+    input_vectors = {}
+    for index, input_name in enumerate(input_names):
+        input_vectors[input_name] = (patterns >> (input_number - 1 - index)) & 1 == 1
+
+    truth_table = np.empty(1 << input_number, dtype=bool)
+    truth_table[:] = evaluate_function(function_tree, input_vectors)
+
+    return truth_table, False
+
+
+def is_flip_flop_output(pin_name, input_names) -> bool:
+    return any("CK" in name or "RESET" in name or "GATE" in name or "CLK" in name for name in
+               input_names) or "Q" in pin_name
+
+
+def input_pattern_index(inputs, input_names):
+    """
+    Pack the inputs values into the index of the truth table row.
+
+    Parameters:
+    -----------
+    inputs: dict
+        The inputs values (0/1 or bool) by input name.
+
+    input_names: list(str)
+        The inputs names of the cell, the first input is the most significant bit.
+
+    Returns:
+    --------
+    int | None:
+        The input pattern integer or None if an input value is missing.
+    """
+    index = 0
+    for input_name in input_names:
+        if input_name not in inputs or inputs[input_name] is None:
+            return None
+        index = (index << 1) | int(bool(inputs[input_name]))
+    return index
+
+
+FUNCTION_TOKEN_PATTERN = re.compile(r"\s*(?:([A-Za-z_][\w\[\]\.]*)|([01])|([!'^*&+|()]))")
+
+
+def tokenize_function(function) -> list[str]:
+    tokens = []
+    function = function.replace('"', '').strip()
+    position = 0
+    while position < len(function):
+        match = FUNCTION_TOKEN_PATTERN.match(function, position)
+        if match is None or match.end() == position:
+            if function[position:].strip() == "":
+                break
+            raise ValueError(f"Invalid character in Liberty function {function!r} at {position}")
+        tokens.append(match.group(match.lastindex))
+        position = match.end()
+    return tokens
+
+
+def parse_function(function) -> tuple:
+    """
+    Parse a Liberty boolean function into a syntax tree.
+
+    Operators from the highest to the lowest precedence: ' and ! (NOT), ^ (XOR), * & and space (AND), + and | (OR).
+
+    Returns:
+    --------
+    tuple:
+        Nested tuples ("var", name), ("const", value), ("not", operand) or (operator, left, right)
+        with operator in "and", "or" and "xor".
+    """
+    tokens = tokenize_function(function)
+    position = 0
+
+    def peek():
+        return tokens[position] if position < len(tokens) else None
+
+    def take():
+        nonlocal position
+        token = peek()
+        if token is None:
+            raise ValueError(f"Unexpected end of Liberty function {function!r}")
+        position += 1
+        return token
+
+    def parse_or():
+        node = parse_and()
+        while peek() in ("+", "|"):
+            take()
+            node = ("or", node, parse_and())
+        return node
+
+    def parse_and():
+        node = parse_xor()
+        while True:
+            token = peek()
+            if token in ("*", "&"):
+                take()
+            elif token is None or token in ("+", "|", ")", "^", "'"):
+                return node
+            # An operand directly following another one is an implicit AND
+            node = ("and", node, parse_xor())
+
+    def parse_xor():
+        node = parse_not()
+        while peek() == "^":
+            take()
+            node = ("xor", node, parse_not())
+        return node
+
+    def parse_not():
+        if peek() == "!":
+            take()
+            return ("not", parse_not())
+        node = parse_operand()
+        while peek() == "'":
+            take()
+            node = ("not", node)
+        return node
+
+    def parse_operand():
+        token = take()
+        if token == "(":
+            node = parse_or()
+            if take() != ")":
+                raise ValueError(f"Missing closing parenthesis in Liberty function {function!r}")
+            return node
+        if token in ("0", "1"):
+            return "const", token == "1"
+        if token[0].isalpha() or token[0] == "_":
+            return "var", token
+        raise ValueError(f"Unexpected {token!r} in Liberty function {function!r}")
+
+    tree = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Unexpected {peek()!r} in Liberty function {function!r}")
+
+    return tree
+
+
+def evaluate_function(function_tree, input_vectors):
+    """
+    Evaluate a parsed Liberty function over boolean vectors.
+
+    Parameters:
+    -----------
+    function_tree: tuple
+        The syntax tree returned by parse_function.
+
+    input_vectors: dict
+        The NumPy boolean vector (or bool) of each input name.
+
+    Returns:
+    --------
+    np.ndarray | bool:
+        The output values, a scalar bool if the function does not depend on any input.
+
+    Raises:
+    -------
+    ValueError: If the function uses a name which is not in input_vectors.
+    """
+    node_type = function_tree[0]
 
-            truth_table.append((input_values, {pin_name: result}))
+    if node_type == "var":
+        if function_tree[1] not in input_vectors:
+            raise ValueError(f"Unknown pin {function_tree[1]} in Liberty function")
+        return input_vectors[function_tree[1]]
+    if node_type == "const":
+        return function_tree[1]
+    if node_type == "not":
+        return np.logical_not(evaluate_function(function_tree[1], input_vectors))
 
-    return truth_table, is_flip_flop
+    left = evaluate_function(function_tree[1], input_vectors)
+    right = evaluate_function(function_tree[2], input_vectors)
+    if node_type == "and":
+        return np.logical_and(left, right)
+    if node_type == "or":
+        return np.logical_or(left, right)
+    return np.logical_xor(left, right)
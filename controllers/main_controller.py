@@ -1,23 +1,26 @@
 import copy
 import csv
 import datetime
+import functools
 import itertools
 import json
 import os
 import sys
-import threading
 import time
 import random
 
 import gdspy
-from PyQt5.QtWidgets import QFileDialog
+from PyQt5.QtWidgets import QApplication, QFileDialog
 import cv2
 import numpy as np
 import pandas as pd
 
 from controllers import def_parser, gui_parser
-from controllers.GDS_Object.auto_ops_propagation import AutoOPSPropagation
 from controllers.lib_reader import LibReader
+from controllers.mosaic import export_mosaic
+from controllers.propagation_cache import PropagationCache, DEFAULT_CACHE_DIR
+from controllers.render_cache import RenderCache, LAYOUT_CACHE_ENTRIES, EOFM_CACHE_ENTRIES
+from controllers.render_worker import RenderWorker
 from controllers.simulation import Simulation, benchmark_simulation_object, rcv_parameter, export_simulation_object
 from views.dialogs.column_dialog import ColumnSelectionDialog
 from views.dialogs.layer_list_dialog import LayerSelectionDialog
@@ -36,12 +39,15 @@ class MainController:
         self.script = script
         self.command_line = command_line
 
-        self.merged_image_matrix = np.empty(shape=(3000, 3000))
-        self.merged_image_matrix.fill(0)
+        self.merged_image_matrix = np.zeros(shape=(3000, 3000))
 
         self.patch_counter = [1, 1]
         self.gds_cell_list = None
         self.lib_reader = None
+        self.propagation_cache = PropagationCache(DEFAULT_CACHE_DIR)
+        # Rendered layouts and EOFM images, switching tabs or moving the laser does not render them again
+        self.layout_cache = RenderCache(LAYOUT_CACHE_ENTRIES)
+        self.eofm_cache = RenderCache(EOFM_CACHE_ENTRIES)
         self.selected_layer = None
         self.propagation_master = None
         self.def_file = None
@@ -65,9 +71,6 @@ class MainController:
         self.voltage_value = 1.2
         self.noise_percentage = 5
 
-        self.max_voltage_high_gate_state = float('-inf')
-        self.high_gate_state_layout = None
-
         # to initialize the value and the rcv mask
 
         self.x_position = 1500
@@ -94,7 +97,11 @@ class MainController:
 
         self.main_label_value = ""
 
+        # The rendered cell or patch is kept as a sparse layout, densified on the first access to image_matrix
+        self.image_layout = None
         self.image_matrix = None
+        # The render inputs of the current image, None if it can not be cached (merged, imported or generated)
+        self.image_key = None
 
         self.app_state = 0
 
@@ -106,6 +113,12 @@ class MainController:
 
             self.is_plot_export = False
 
+            # The view is rendered by a single worker thread and updated in the GUI thread
+            self.render_worker = RenderWorker()
+            self.render_worker.rendered.connect(self.update_rendered_view)
+            QApplication.instance().aboutToQuit.connect(self.render_worker.stop)
+            self.render_worker.start()
+
             self.reload_view()
 
         else:
@@ -140,7 +153,9 @@ class MainController:
                   "merge To merge the propagation into the precedent matrix\n"
                   "reset: To reset the merged matrix to 0\n"
                   "rcv: To calculate the rcv value of the current matrix. You can use the {export} argument to save it in export/rcv.csv\n"
+                  "rcv scan: {x0:x1:dx} {y0:y1:dy} to calculate the rcv value on a grid of positions (bounds included) and save it in export/rcv.csv\n"
                   "plot: {original, rcv, psf, eofm{-abs}, save} to plot the matrix\n"
+                  "mosaic: {eofm, rcv} {file} {jobs} to render the map of the whole DEF design in a .npy file\n"
                   "export: To export the numpy array matrix\n"
                   "-----------------------------------------")
 
@@ -148,12 +163,54 @@ class MainController:
             gui_parser.parse_info(self)
         elif command.startswith("update"):
             gui_parser.update_variable(self, command)
+        elif command.startswith("mosaic"):
+            arguments = command.split()
+            mosaic_type = arguments[1] if len(arguments) > 1 else "eofm"
+            file_path = arguments[2] if len(arguments) > 2 else f"export/mosaic_{mosaic_type}.npy"
+
+            if self.def_file is None:
+                print("No DEF file loaded, set def_file in the config file.")
+                return
+
+            try:
+                jobs = int(arguments[3]) if len(arguments) > 3 else 1
+                G1 = rcv_parameter(self.Kn_value, self.voltage_value, self.beta_value, self.Pl_value)
+                G2 = rcv_parameter(self.Kp_value, self.voltage_value, self.beta_value, self.Pl_value)
+                shape = export_mosaic(self.object_storage_list, self.def_file, self.simulation, G1, G2, file_path,
+                                      mosaic_type, vpi_extraction=self.vpi_extraction, jobs=jobs)
+            except ValueError as e:
+                print(f"Error {e}")
+                return
+
+            print(f"{mosaic_type} map of {shape[1]}x{shape[0]} pixels saved in {file_path}")
+
+        elif command.startswith("rcv scan"):
+            try:
+                _, _, x_range, y_range = command.split()
+                x_positions = gui_parser.parse_scan_range(x_range)
+                y_positions = gui_parser.parse_scan_range(y_range)
+            except ValueError:
+                print("Invalid input format. Please use 'rcv scan x0:x1:dx y0:y1:dy'.")
+                return
+
+            self.update_image_matrix()
+            values = self.simulation.rcv_map(self.get_simulation_object(), x_positions=x_positions,
+                                             y_positions=y_positions)
+
+            csv_file_path = os.path.join("export/rcv.csv")
+            with open(csv_file_path, mode='a', newline='') as csv_file:
+                csv_writer = csv.writer(csv_file)
+                csv_writer.writerows(
+                    [self.cell_name, self.state_list, self.flip_flop, x_position, y_position, values[i, j]]
+                    for j, x_position in enumerate(x_positions) for i, y_position in enumerate(y_positions))
+            print(f"{values.size} results saved in export/rcv.csv")
+
         elif command.startswith("rcv"):
             self.update_image_matrix()
-            result, value, self.main_label_value = self.simulation.overlay_psf_rcv(
-                self.image_matrix,
-                self.x_position,
-                self.y_position
+            # X and y are reversed because we are using the matrix with origin lower
+            value, self.main_label_value = self.simulation.calc_RCV_value(
+                self.get_simulation_object(),
+                offset=[self.y_position, self.x_position]
             )
             _, variable = command.split(' ', 1)
             variable = variable.strip()
@@ -245,16 +302,67 @@ class MainController:
 
     def merge_image_matrix(self):
         self.update_image_matrix()
-        self.merged_image_matrix += np.where(self.merged_image_matrix == 0, self.image_matrix, 0)
-        self.image_matrix = copy.deepcopy(self.merged_image_matrix)
+        self.merge_current_image()
+
+    def merge_current_image(self):
+        # Only the window of the rendered cell or patch is merged, in place
+        if self.image_layout is not None:
+            window = self.image_layout.get_bounding_box()
+            image_window = self.image_layout.to_array(window)
+        else:
+            window = (slice(None), slice(None))
+            image_window = self.image_matrix
+
+        merged_window = self.merged_image_matrix[window]
+        np.copyto(merged_window, image_window, where=merged_window == 0)
+
+        # The current view shares the merged matrix memory
+        self.image_matrix = self.merged_image_matrix
 
     def reset_merge_image_matrix(self):
-        self.merged_image_matrix = np.empty(shape=(3000, 3000))
-        self.merged_image_matrix.fill(0)
+        # A new zero matrix, its pages are only allocated when merged into, the current view keeps its matrix
+        self.merged_image_matrix = np.zeros(shape=(3000, 3000))
+        self.merge = False
         self.reload_view()
 
     def reload_view(self):
-        threading.Thread(target=self.reload_view_wrapper).start()
+        # The command line has no view to render, its commands update the matrix themselves
+        if self.command_line:
+            return
+
+        # The settings are read from the view in the GUI thread, the worker renders a snapshot of them
+        self.update_settings()
+        self.view.set_footer_label("... Loading ...")
+        self.render_worker.request_render(functools.partial(self.render_snapshot_view, self.get_render_snapshot()))
+
+    def get_render_snapshot(self):
+        """
+        Copy the render inputs of the controller, the copy is rendered while the GUI thread changes the settings.
+
+        Returns:
+        --------
+        MainController:
+            A shallow copy of the controller with its own simulation.
+        """
+        render_snapshot = copy.copy(self)
+        render_snapshot.simulation = copy.copy(self.simulation)
+
+        return render_snapshot
+
+    def apply_render_snapshot(self, render_snapshot):
+        # The rendered matrix replaces the current one in the GUI thread, with the view updates of the render
+        self.image_matrix = render_snapshot._image_matrix
+        self.image_layout = render_snapshot.image_layout
+        self.image_key = render_snapshot.image_key
+        self.simulation.nm_scale = render_snapshot.simulation.nm_scale
+        self.main_label_value = render_snapshot.main_label_value
+        self.dataframe = render_snapshot.dataframe
+        self.propagation_master = render_snapshot.propagation_master
+        self.is_flip_flop = render_snapshot.is_flip_flop
+
+        if render_snapshot.merge:
+            self.merged_image_matrix = render_snapshot.merged_image_matrix
+            self.merge = False
 
     def update_image_matrix(self):
         if not self.imported_image:
@@ -262,17 +370,25 @@ class MainController:
             G2 = rcv_parameter(self.Kp_value, self.voltage_value, self.beta_value, self.Pl_value)
             if self.cell_name is not None and self.cell_name != "" or self.def_file is not None:
                 if self.def_file is not None:
-                    self.image_matrix, self.simulation.nm_scale = benchmark_simulation_object(self.object_storage_list,
-                                                                                              self.def_file, G1, G2,
-                                                                                              self.simulation.FOV,
-                                                                                              self.vpi_extraction,
-                                                                                              self.selected_area,
-                                                                                              nm_scale=self.simulation.nm_scale)
+                    # The design is kept in the cached value, its id is not reused while cached
+                    key = ("def", id(self.def_file), id(self.vpi_extraction), self.selected_area, G1, G2,
+                           self.simulation.nm_scale, self.simulation.FOV)
+                    image_layout, self.simulation.nm_scale, _ = self.layout_cache.get_or_render(
+                        key, lambda: benchmark_simulation_object(self.object_storage_list, self.def_file, G1, G2,
+                                                                 self.simulation.FOV, self.vpi_extraction,
+                                                                 self.selected_area,
+                                                                 nm_scale=self.simulation.nm_scale,
+                                                                 sparse=True) + ((self.def_file,
+                                                                                  self.vpi_extraction),))
                 else:
                     if self.cell_name not in self.object_storage_list.keys():
                         self.extract_op_cell(self.cell_name)
 
                     if self.state_list not in self.object_storage_list[self.cell_name].keys():
+                        # The propagation master of a cell extracted by a cancelled render is extracted again
+                        if self.propagation_master is None or self.propagation_master.name != self.cell_name:
+                            self.extract_op_cell(self.cell_name)
+
                         self.apply_state_propagation(self.state_list, self.flip_flop)
 
                     if self.is_flip_flop:
@@ -281,57 +397,146 @@ class MainController:
                     else:
                         cell_input_string = self.state_list
                     propagation_object = self.object_storage_list[self.cell_name][cell_input_string]
-                    self.image_matrix, self.simulation.nm_scale = export_simulation_object(
-                        propagation_object,
-                        G1, G2, self.simulation.FOV,
-                        nm_scale=self.simulation.nm_scale)
+
+                    # The propagation object is part of the key, a cell extracted again is rendered again
+                    key = ("cell", self.cell_name, cell_input_string, propagation_object, G1, G2,
+                           self.simulation.nm_scale, self.simulation.FOV)
+                    image_layout, self.simulation.nm_scale = self.layout_cache.get_or_render(
+                        key, lambda: export_simulation_object(propagation_object, G1, G2, self.simulation.FOV,
+                                                              nm_scale=self.simulation.nm_scale, sparse=True))
+
+                # The dense matrix of a cached layout is kept when the layout has not changed
+                if image_layout is not self.image_layout:
+                    self.image_matrix = None
+                    self.image_layout = image_layout
+                self.image_key = key
 
             else:
 
                 self.image_matrix = self.draw_layout(self.technology_value / 2, G1, G2, 0)
 
+    @property
+    def image_matrix(self):
+        if self._image_matrix is None and self.image_layout is not None:
+            self._image_matrix = self.image_layout.to_array()
+
+        return self._image_matrix
+
+    @image_matrix.setter
+    def image_matrix(self, image_matrix):
+        self._image_matrix = image_matrix
+        self.image_layout = None
+        self.image_key = None
+
+    def get_cache_label(self):
+        hits = self.layout_cache.hits + self.eofm_cache.hits
+        misses = self.layout_cache.misses + self.eofm_cache.misses
+
+        return f"Cache hits: {hits}, misses: {misses}"
+
+    def get_simulation_object(self):
+        # The RCV is calculated on the sparse layout without densifying it
+        if self.image_layout is not None:
+            return self.image_layout
+
+        return self.image_matrix
+
     def reload_view_wrapper(self):
+        # Rendered in the calling thread, after the render in progress in the worker
+        render_snapshot = self.get_render_snapshot()
+        with self.render_worker.render_lock:
+            view_update_list = self.render_snapshot_view(render_snapshot)
+
+        self.update_view(view_update_list)
+
+    def render_snapshot_view(self, render_snapshot, is_stale=None):
+        # The rendered matrix of the snapshot is applied first, then the view is updated
+        view_update_list = render_snapshot.render_view(is_stale)
+        if view_update_list is not None:
+            view_update_list.insert(0, (self.apply_render_snapshot, (render_snapshot,)))
+
+        return view_update_list
+
+    def render_view(self, is_stale=None):
+        """
+        Render the view of a snapshot of the controller without updating it.
+
+        Once stale, the render is cancelled before the layout stage, before the merge and simulation stages and before
+        the view updates.
+
+        Parameters:
+        -----------
+        is_stale: callable
+            Returns True when a newer render has been requested, the render is then cancelled.
+
+        Returns:
+        --------
+        list | None:
+            The (view method, arguments) updates to apply in the GUI thread, None if the render has been cancelled.
+        """
+        if is_stale is not None and is_stale():
+            return None
+
         self.simulation.nm_scale = 2
-        self.view.set_footer_label("... Loading ...")
         start = time.time()
 
+        self.update_image_matrix()
+
+        if is_stale is not None and is_stale():
+            return None
+
         if self.merge:
-            self.merge_image_matrix()
-        else:
-            self.update_image_matrix()
+            # Merged in a copy taken by the render, the matrix of the controller is replaced when the render is applied
+            self.merged_image_matrix = self.merged_image_matrix.copy()
+            self.merge_current_image()
 
-        self.merge = False
+        view_update_list = []
 
         if self.app_state == 1:
             L = self.print_psf()
-            self.view.display_image(L, self.is_plot_export, "LPS - " + self.main_label_value, True)
+            view_update_list.append(
+                (self.view.display_image, (L, self.is_plot_export, "LPS - " + self.main_label_value, True)))
 
         elif self.app_state == 2:
             result, _ = self.print_rcv_image()
-            self.view.display_image(result, self.is_plot_export, self.main_label_value)
+            view_update_list.append((self.view.display_image, (result, self.is_plot_export, self.main_label_value)))
 
         elif self.app_state == 3:
             R = self.print_EOFM_image()
-            self.view.display_image(R, self.is_plot_export, "EOFM - " + self.main_label_value)
+            view_update_list.append(
+                (self.view.display_image, (R, self.is_plot_export, "EOFM - " + self.main_label_value)))
             inverted_image = np.abs(R)
-            self.view.display_second_image(inverted_image, self.is_plot_export,
-                                           "Absolute EOFM - " + self.main_label_value)
+            view_update_list.append((self.view.display_second_image,
+                                     (inverted_image, self.is_plot_export, "Absolute EOFM - " + self.main_label_value)))
 
         elif self.app_state == 4:
-            self.plot_rcv_calc()
+            result = self.plot_rcv_calc()
+            if result is not None:
+                view_update_list.append((self.view.display_optional_image, (result,)))
+            view_update_list.append((self.view.plot_dataframe, (self.dataframe, self.selected_columns)))
 
         else:
-            self.print_original_image()
+            image_matrix, title = self.print_original_image()
+            view_update_list.append((self.view.display_image, (image_matrix, self.is_plot_export, title)))
+            view_update_list.append((self.patch_matrix_preview, ()))
 
-        end = time.time()
-        self.view.set_footer_label(f"Execution time: {end - start:.2f} seconds")
+        if is_stale is not None and is_stale():
+            return None
 
-    def plot_rcv_calc_wrapper(self):
-        self.view.set_footer_label("... Loading ...")
-        start = time.time()
-        self.plot_rcv_calc()
         end = time.time()
-        self.view.set_footer_label(f"Execution time for plot_rcv_calc: {end - start:.2f} seconds")
+        view_update_list.append((self.view.set_footer_label,
+                                 (f"Execution time: {end - start:.2f} seconds - {self.get_cache_label()}",)))
+
+        return view_update_list
+
+    def update_view(self, view_update_list):
+        for view_update, arguments in view_update_list:
+            view_update(*arguments)
+
+    def update_rendered_view(self, request_id, view_update_list):
+        # A render made stale by a newer request after its completion is not displayed
+        if not self.render_worker.is_stale(request_id):
+            self.update_view(view_update_list)
 
     def set_state(self, state):
         self.app_state = int(state)
@@ -382,6 +587,9 @@ class MainController:
                     self.lib_reader = LibReader(lib_file)
                     self.selected_layer = data["op_config"]["layer_list"]
 
+                    # An empty cache_dir bypasses the extracted cells cache
+                    self.propagation_cache = PropagationCache(data["op_config"].get("cache_dir", DEFAULT_CACHE_DIR))
+
                     if vpi_file is not None and vpi_file != "":
                         self.vpi_extraction = {}
                         with open(vpi_file, 'r') as file:
@@ -395,13 +603,7 @@ class MainController:
                         self.patch_counter = self.def_file[3]
                         for cell_name in cell_name_list:
                             self.extract_op_cell(cell_name)
-                            combinations = list(
-                                itertools.product([0, 1], repeat=len(self.propagation_master.inputs_list)))
-                            for input_combination in combinations:
-                                input_str = ''.join(map(str, input_combination))
-                                self.apply_state_propagation(input_str, 0)
-                                if self.is_flip_flop:
-                                    self.apply_state_propagation(input_str, 1)
+                            self.apply_all_state_propagations()
 
                 return data
 
@@ -467,6 +669,7 @@ class MainController:
 
     def export_plots(self):
         start = time.time()
+        self.update_settings()
 
         self.is_plot_export = True
         state = self.app_state
@@ -557,7 +760,9 @@ class MainController:
             selected_files = file_dialog.selectedFiles()
             if selected_files:
                 file_path = selected_files[0]
-                self.data = self.load_settings_from_json(file_path)
+                # The extracted cells are not modified during a render
+                with self.render_worker.render_lock:
+                    self.data = self.load_settings_from_json(file_path)
                 # TODO handle error
                 self.reload_view()
                 self.update_view_input()
@@ -614,34 +819,14 @@ class MainController:
 
         return layout_full
 
-    def calc_unique_rcv(self, voltage, L, old_G1, old_G2):
-
-        # may be when the voltage is > 0,5 changing the gate state
-        G1 = rcv_parameter(self.Kn_value, self.voltage_value, self.beta_value, self.Pl_value)
-        G2 = rcv_parameter(self.Kp_value, self.voltage_value, self.beta_value, self.Pl_value)
-
-        generated_gate_image = np.select([self.image_matrix == old_G1, self.image_matrix == old_G2], [G1, G2],
-                                         self.image_matrix)
-
-        # for preview in gui of current position of laser
-        if voltage > self.max_voltage_high_gate_state:
-            self.high_gate_state_layout = generated_gate_image
-            self.max_voltage_high_gate_state = voltage
-
-        amp_abs = np.sum(generated_gate_image * L)
-        num_pix_under_laser = np.sum(L > 0)
-
-        amp_rel = amp_abs / num_pix_under_laser
-
-        return amp_rel
-
     def update_cell_values(self, merge=False):
         cell_name_value = self.view.cell_selector.get_cell_name()
         self.view.cell_selector.set_cell_name(str(cell_name_value))
         state_list_value = self.view.cell_selector.get_state_list()
 
         self.def_file = None
-        self.merge = merge
+        # A pending merge is kept until a render merges it
+        self.merge = self.merge or merge
 
         if cell_name_value is not None and cell_name_value != "":
             self.cell_name = cell_name_value
@@ -727,15 +912,11 @@ class MainController:
         else:
             title = "Generated image.py"
 
-        self.view.display_image(self.image_matrix, self.is_plot_export, title)
-        self.patch_matrix_preview()
+        return self.image_matrix, title
 
     def print_rcv_image(self):
         self.dataframe = None
 
-        if not self.command_line:
-            self.update_settings()
-
         result, value, self.main_label_value = self.simulation.overlay_psf_rcv(self.image_matrix, self.x_position,
                                                                                self.y_position)
 
@@ -744,10 +925,12 @@ class MainController:
     def print_EOFM_image(self):
         self.dataframe = None
 
-        if not self.command_line:
-            self.update_settings()
+        key = None
+        if self.image_key is not None:
+            key = ("eofm", self.image_key, self.simulation.psf_kernel_key(), self.simulation.FOV)
 
-        R, self.main_label_value = self.simulation.print_EOFM_image(self.image_matrix)
+        R, self.main_label_value = self.eofm_cache.get_or_render(
+            key, lambda: self.simulation.print_EOFM_image(self.image_matrix))
 
         return R
 
@@ -774,8 +957,6 @@ class MainController:
 
     def print_psf(self):
         self.dataframe = None
-        if not self.command_line:
-            self.update_settings()
 
         L, self.main_label_value = self.simulation.get_psf(FOV=3000)
 
@@ -786,8 +967,6 @@ class MainController:
 
     def plot_rcv_calc(self):
         self.app_state = 4
-        self.max_voltage_high_gate_state = float('-inf')
-        self.high_gate_state_layout = None
 
         selected_columns = self.selected_columns
 
@@ -796,15 +975,37 @@ class MainController:
         old_G1 = rcv_parameter(self.Kn_value, self.voltage_value, self.beta_value, self.Pl_value)
         old_G2 = rcv_parameter(self.Kp_value, self.voltage_value, self.beta_value, self.Pl_value)
 
-        self.dataframe['RCV'] = self.dataframe.apply(
-            lambda row: self.calc_unique_rcv(row[selected_columns[1]], L, old_G1, old_G2), axis=1)
+        # The RCV is linear in G1 and G2, the PSF is summed once over the NMOS, PMOS and other zones
+        nmos_zones = self.image_matrix == old_G1
+        pmos_zones = (self.image_matrix == old_G2) & ~nmos_zones
+        other_zones = ~(nmos_zones | pmos_zones)
+        num_pix_under_laser = np.sum(L > 0)
 
-        if self.high_gate_state_layout is not None:
-            points = np.where(self.high_gate_state_layout != 0, 1, 0)
+        nmos_weight = np.sum(L[nmos_zones]) / num_pix_under_laser
+        pmos_weight = np.sum(L[pmos_zones]) / num_pix_under_laser
+        other_rcv = np.sum(self.image_matrix[other_zones] * L[other_zones]) / num_pix_under_laser
+
+        # The gate reflections follow the voltage of each time point
+        voltage = self.dataframe[selected_columns[1]].to_numpy(dtype=float)
+        G1 = rcv_parameter(self.Kn_value, voltage, self.beta_value, self.Pl_value)
+        G2 = rcv_parameter(self.Kp_value, voltage, self.beta_value, self.Pl_value)
+
+        # A new dataframe, the displayed one is not modified during the render
+        self.dataframe = self.dataframe.assign(RCV=nmos_weight * G1 + pmos_weight * G2 + other_rcv)
+
+        # Preview of the gates at the highest voltage with the laser position
+        result = None
+        if not np.all(np.isnan(voltage)):
+            max_voltage = np.nanmax(voltage)
+            high_gate_state_layout = np.select(
+                [nmos_zones, pmos_zones],
+                [rcv_parameter(self.Kn_value, max_voltage, self.beta_value, self.Pl_value),
+                 rcv_parameter(self.Kp_value, max_voltage, self.beta_value, self.Pl_value)],
+                self.image_matrix)
+            points = np.where(high_gate_state_layout != 0, 1, 0)
             result = cv2.addWeighted(points, 1, mask, 1, 0)
-            self.view.display_optional_image(result)
 
-        self.view.plot_dataframe(self.dataframe, selected_columns)
+        return result
 
     def volage_column_dialog(self):
         # Get the column names from the dataframe
@@ -816,7 +1017,7 @@ class MainController:
         if dialog.exec():
             self.selected_columns = dialog.get_selected_columns()
 
-            threading.Thread(target=self.plot_rcv_calc_wrapper).start()
+            self.set_state(4)
 
     def init_propagation_object(self):
         technology_dialog = TechnologySelectionDialog()
@@ -840,14 +1041,40 @@ class MainController:
             try:
                 truth_table, voltage, input_names, self.is_flip_flop = self.lib_reader.extract_truth_table(
                     gds_cell_name)
-                self.propagation_master = AutoOPSPropagation(gds_cell_name, gds_cell, self.selected_layer, truth_table,
-                                                             voltage, input_names)
+                self.propagation_master = self.propagation_cache.get_propagation_master(gds_cell_name, gds_cell,
+                                                                                       self.selected_layer,
+                                                                                       truth_table, voltage,
+                                                                                       input_names)
 
                 self.object_storage_list[gds_cell_name] = {}
 
+                # The rendered states of the previous extraction are dropped
+                self.layout_cache.clear()
+                self.eofm_cache.clear()
+
             except Exception as e:
                 print(f"Error {e}")
 
+    def apply_all_state_propagations(self):
+        # Every input combination (and flip-flop output Q) of the cell is propagated at once
+        state_result_list = self.propagation_master.get_all_state_results(self.is_flip_flop, 0)
+        input_number = len(self.propagation_master.inputs_list)
+
+        for combination, state_result in zip(
+                itertools.product([0, 1], repeat=input_number + int(self.is_flip_flop)), state_result_list):
+            cell_input_string = ''.join(map(str, combination[:input_number]))
+            if self.is_flip_flop:
+                # format of key for a flip-flop is "inputs_output" -> "01010_1"
+                cell_input_string = cell_input_string + "_" + str(combination[-1])
+
+            if state_result is None:
+                # The state is skipped as in run_auto_ops, the gates using it fall back to the default state
+                print(f"Error: the propagation of {self.propagation_master.name} with the input combination "
+                      f"{cell_input_string} reaches a pin without state")
+                continue
+
+            self.object_storage_list[self.propagation_master.name][cell_input_string] = state_result
+
     def apply_state_propagation(self, cell_input_string, flip_flop):
         draw_inputs = {}
         inputs_list = self.propagation_master.inputs_list
@@ -858,15 +1085,11 @@ class MainController:
             for index, inp in enumerate(inputs_list):
                 draw_inputs[inp] = cell_input[index]
 
-            propagation_object = copy.deepcopy(self.propagation_master)
-            propagation_object.apply_state(draw_inputs, flip_flop)
-
-            if self.def_file is not None:
-                propagation_object.calculate_orientations()
+            self.propagation_master.apply_state(draw_inputs, flip_flop)
 
             if self.is_flip_flop:
                 # format of key for a flip-flop is "inputs_output" -> "01010_1"
                 cell_input_string = cell_input_string + "_" + str(flip_flop)
 
-            self.object_storage_list[self.propagation_master.name][cell_input_string] = copy.deepcopy(
-                propagation_object)
+            self.object_storage_list[self.propagation_master.name][cell_input_string] = \
+                self.propagation_master.get_state_result()
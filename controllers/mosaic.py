@@ -0,0 +1,244 @@
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from controllers.eofm_engine import EOFMEngine
+from controllers.simulation import fill_gates, get_summed_area_table
+
+# Per process context of the tile rendering, set by init_mosaic_context
+mosaic_context = {}
+
+
+def export_mosaic(object_list, def_extract, simulation, G1, G2, file_path, mosaic_type="eofm", vpi_extraction=None,
+                  jobs=1) -> tuple[int, int]:
+    """
+    Render the EOFM or RCV map of the whole design in a memory-mapped .npy file.
+
+    Each DEF patch is an output tile. A tile is rasterized with a margin of the PSF support around it and convolved
+    with the PSF, only the tile itself is kept (overlap-save), so the map has no seam between the patches. The tiles
+    are written directly in the .npy file, the design map is never held in memory. The non-confocal PSF is separable,
+    the tiles are then convolved with its row and column profiles.
+
+    Parameters:
+    -----------
+    object_list: dict
+        The propagation states by cell name and input combination.
+
+    def_extract: list
+        The DEF extraction from get_gates_info_from_def_file.
+
+    simulation: Simulation
+        The laser settings and the scale (nm per pixel) of the map.
+
+    G1: float
+        The reflection value of the NMOS zones.
+
+    G2: float
+        The reflection value of the PMOS zones.
+
+    file_path: str
+        Path of the .npy output file, the map is indexed by [y, x] from the lower left corner of the design.
+
+    mosaic_type: str
+        'eofm' for the EOFM image or 'rcv' for the RCV value at each laser position.
+
+    vpi_extraction: dict
+        The input and output combinations of each gate, the first combination of the cell is used if None.
+
+    jobs: int
+        Number of processes rendering the tiles.
+
+    Returns:
+    --------
+    tuple[int, int]:
+        The shape of the map.
+
+    Raises:
+    -------
+    ValueError: If the mosaic type is unknown.
+    """
+    if mosaic_type not in ("eofm", "rcv"):
+        raise ValueError(f"Unknown mosaic type {mosaic_type}, expected eofm or rcv")
+
+    scale_up = int(1000 / simulation.nm_scale)
+    tile_size = int(def_extract[0]["patch_size"] * scale_up)
+    width_patch, height_patch = def_extract[3]
+    shape = (height_patch * tile_size, width_patch * tile_size)
+
+    psf = simulation.get_psf_kernel()
+    if psf is not None:
+        psf_vectors = None
+        psf_shape = psf.shape
+    else:
+        # The Gaussian PSF is the outer product of its row and column profiles, the 2-D PSF is never built
+        psf_vectors = simulation.get_psf_vectors(simulation.FOV // 2, simulation.FOV // 2,
+                                                 (simulation.FOV, simulation.FOV))
+        psf_shape = (simulation.FOV, simulation.FOV)
+    psf_center = (psf_shape[0] // 2, psf_shape[1] // 2)
+
+    pixel_table = None
+    if mosaic_type == "rcv":
+        # The RCV at a laser position is the EOFM value divided by the number of pixels under the laser inside the map
+        psf_mask = psf > 0 if psf is not None else np.outer(*psf_vectors) > 0
+        pixel_table = get_summed_area_table(psf_mask)
+    psf_key = simulation.psf_kernel_key() + (simulation.FOV,)
+
+    np.lib.format.open_memmap(file_path, mode='w+', dtype=np.float32, shape=shape).flush()
+
+    context_arguments = (object_list, def_extract, vpi_extraction, G1, G2, scale_up, psf, psf_vectors, psf_shape,
+                         psf_center, psf_key, pixel_table, file_path)
+    tile_list = [(i, j) for i in range(height_patch) for j in range(width_patch)]
+
+    if jobs is not None and jobs > 1:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_mosaic_context,
+                                 initargs=context_arguments) as executor:
+            for _ in executor.map(render_mosaic_tile, tile_list):
+                pass
+    else:
+        init_mosaic_context(*context_arguments)
+        for tile in tile_list:
+            render_mosaic_tile(tile)
+
+    mosaic_context.clear()
+
+    return shape
+
+
+def init_mosaic_context(object_list, def_extract, vpi_extraction, G1, G2, scale_up, psf, psf_vectors, psf_shape,
+                        psf_center, psf_key, pixel_table, file_path) -> None:
+    """
+    Store the design, the PSF and the opened map of the process rendering the tiles.
+
+    Returns:
+    --------
+    None
+    """
+    dif_size = def_extract[0]
+    patch_size = dif_size["patch_size"]
+
+    # A gate is stored in the patch of its origin, its zones can reach the neighbouring patches
+    max_cell_size = max([max(cell_state.get_width(), cell_state.get_height())
+                         for cell_states in object_list.values() for cell_state in cell_states.values()], default=0)
+
+    mosaic_context.update({
+        "object_list": object_list,
+        "def_extract": def_extract,
+        "vpi_extraction": vpi_extraction,
+        "G1": G1,
+        "G2": G2,
+        "scale_up": scale_up,
+        "tile_size": int(patch_size * scale_up),
+        "gate_margin": max_cell_size,
+        "psf": psf,
+        "psf_vectors": psf_vectors,
+        "psf_shape": psf_shape,
+        "psf_center": psf_center,
+        "psf_key": psf_key,
+        "pixel_table": pixel_table,
+        "engine": EOFMEngine(dtype=np.float32),
+        "mosaic": np.load(file_path, mmap_mode='r+'),
+    })
+
+
+def render_mosaic_tile(tile) -> tuple[int, int]:
+    """
+    Render one tile of the map and write it in the memory-mapped file.
+
+    Parameters:
+    -----------
+    tile: tuple[int, int]
+        The patch row and column.
+
+    Returns:
+    --------
+    tuple[int, int]:
+        The rendered tile.
+    """
+    i, j = tile
+    dif_size, gate_dict, _, (width_patch, height_patch) = mosaic_context["def_extract"]
+    patch_size = dif_size["patch_size"]
+    scale_up = mosaic_context["scale_up"]
+    tile_size = mosaic_context["tile_size"]
+    psf_shape = mosaic_context["psf_shape"]
+    psf_center = mosaic_context["psf_center"]
+
+    # The tile value at a pixel is the sum of the layout under the PSF centered on this pixel
+    margin_before = (psf_shape[0] - 1 - psf_center[0], psf_shape[1] - 1 - psf_center[1])
+    start_y = i * tile_size - margin_before[0]
+    start_x = j * tile_size - margin_before[1]
+
+    layout = np.zeros((tile_size + psf_shape[0] - 1, tile_size + psf_shape[1] - 1), dtype=np.float32)
+
+    # Patches whose gates can reach the rasterized area
+    patch_margin = mosaic_context["gate_margin"] * scale_up
+    row_range = get_patch_range(start_y, start_y + layout.shape[0], patch_margin, tile_size, height_patch)
+    column_range = get_patch_range(start_x, start_x + layout.shape[1], patch_margin, tile_size, width_patch)
+
+    for row in row_range:
+        for column in column_range:
+            fill_gates(layout, mosaic_context["object_list"], gate_dict[row * width_patch + column]['gates'],
+                       mosaic_context["G1"], mosaic_context["G2"], dif_size["ll_x"], dif_size["ll_y"], scale_up,
+                       offset_x=start_x, offset_y=start_y, vpi_extraction=mosaic_context["vpi_extraction"])
+
+    # The full convolution at the last PSF pixel of each side is the centered convolution of the tile
+    psf_offset = (psf_shape[0] - 1, psf_shape[1] - 1)
+    if mosaic_context["psf_vectors"] is not None:
+        row_vector, column_vector = mosaic_context["psf_vectors"]
+        result = mosaic_context["engine"].convolve_separable(layout, row_vector, column_vector, psf_offset)
+    else:
+        psf = mosaic_context["psf"]
+        result = mosaic_context["engine"].convolve(layout, mosaic_context["psf_key"], psf_shape, psf_offset,
+                                                   lambda: psf)
+
+    result = result[:tile_size, :tile_size]
+
+    mosaic = mosaic_context["mosaic"]
+    if mosaic_context["pixel_table"] is not None:
+        # As calc_RCV_value, only the PSF pixels inside the map are counted under the laser
+        rows = np.arange(i * tile_size, (i + 1) * tile_size)
+        columns = np.arange(j * tile_size, (j + 1) * tile_size)
+        result = result / get_pixel_counts(mosaic_context["pixel_table"], rows, columns, psf_center, mosaic.shape)
+
+    mosaic[i * tile_size:(i + 1) * tile_size, j * tile_size:(j + 1) * tile_size] = result
+    mosaic.flush()
+
+    return tile
+
+
+def get_pixel_counts(pixel_table, rows, columns, psf_center, shape) -> np.ndarray:
+    """
+    Count the PSF pixels above zero inside the map, for the laser at each row and column of a tile.
+
+    The PSF pixel k is over the map pixel (position + psf_center - k), the count over the kept PSF pixels is read from
+    the summed-area table of the PSF pixels above zero.
+
+    Returns:
+    --------
+    np.ndarray:
+        The (rows, columns) pixel counts.
+    """
+    psf_shape = (pixel_table.shape[0] - 1, pixel_table.shape[1] - 1)
+
+    start_rows = np.clip(rows + psf_center[0] - shape[0] + 1, 0, psf_shape[0])[:, np.newaxis]
+    end_rows = np.clip(rows + psf_center[0] + 1, 0, psf_shape[0])[:, np.newaxis]
+    start_columns = np.clip(columns + psf_center[1] - shape[1] + 1, 0, psf_shape[1])
+    end_columns = np.clip(columns + psf_center[1] + 1, 0, psf_shape[1])
+
+    return (pixel_table[end_rows, end_columns] - pixel_table[start_rows, end_columns]
+            - pixel_table[end_rows, start_columns] + pixel_table[start_rows, start_columns])
+
+
+def get_patch_range(start, stop, margin, tile_size, patch_number) -> range:
+    """
+    Get the patches of an axis intersecting the [start - margin, stop + margin) pixel interval.
+
+    Returns:
+    --------
+    range:
+        The patch indexes.
+    """
+    first = max(math.floor((start - margin) / tile_size), 0)
+    last = min(math.floor((stop + margin) / tile_size), patch_number - 1)
+
+    return range(first, last + 1)
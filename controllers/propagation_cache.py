@@ -0,0 +1,165 @@
+import datetime
+import functools
+import glob
+import hashlib
+import io
+import os
+import pickle
+import shutil
+
+from controllers.GDS_Object.auto_ops_propagation import AutoOPSPropagation
+
+# Increase when the cache entry format changes, the extraction sources are hashed in every key
+CACHE_VERSION = 8
+
+# The GDS_Object package of the extraction, a change in any of its modules invalidates the existing cache entries
+EXTRACTION_SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "GDS_Object")
+
+DEFAULT_CACHE_DIR = ".auto_ops_cache"
+
+# Fixed GDS timestamp and multiplier so that the same cell always serializes to the same bytes
+GDS_TIMESTAMP = datetime.datetime(2000, 1, 1)
+GDS_MULTIPLIER = 1e6
+
+
+class PropagationCache:
+    """
+    Content-addressed on-disk cache of the extracted AutoOPSPropagation masters.
+
+    Each master is stored under a key computed from the GDS bytes of the cell (and of its referenced cells),
+    the layer list and the Liberty definition of the cell (truth table, voltage and inputs).
+    Any change in the library, the layer list, the extraction sources or the cache version produces a new key.
+
+    Args:
+        cache_dir (str): The directory where the masters are stored. If None or empty, the cache is bypassed.
+        clear (bool): Remove every stored master before using the cache.
+
+    Attributes:
+        cache_dir (str): The directory where the masters are stored.
+        hit_counter (int): The number of masters loaded from the cache.
+        miss_counter (int): The number of masters extracted and stored.
+
+    Example usage:
+        >>> cache = PropagationCache(".auto_ops_cache")
+        >>> propagation_master = cache.get_propagation_master("INV_X1", gds_cell, layer_list, truth_table, voltage,
+        >>>                                                   input_names)
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, clear=False):
+        self.cache_dir = cache_dir
+        self.hit_counter = 0
+        self.miss_counter = 0
+
+        if self.cache_dir and clear:
+            self.clear()
+
+    def clear(self) -> None:
+        """
+        Remove every stored master from the cache directory.
+        """
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+    def get_propagation_master(self, cell_name, gds_cell, layer_list, truth_table, voltage,
+                               input_names) -> AutoOPSPropagation:
+        """
+        Load the AutoOPSPropagation master of a cell from the cache, or extract and store it on a miss.
+
+        Returns:
+            AutoOPSPropagation: The master object of the cell, without any state applied.
+        """
+        if not self.cache_dir:
+            return AutoOPSPropagation(cell_name, gds_cell, layer_list, truth_table, voltage, input_names)
+
+        key = cache_key(gds_cell, layer_list, truth_table, voltage, input_names)
+        path = os.path.join(self.cache_dir, key[:2], key + ".pkl")
+
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as cache_file:
+                    propagation_master = pickle.load(cache_file)
+                self.hit_counter += 1
+                return propagation_master
+            except Exception:
+                # A corrupted or incompatible entry is extracted again and overwritten
+                pass
+
+        propagation_master = AutoOPSPropagation(cell_name, gds_cell, layer_list, truth_table, voltage, input_names)
+        self.miss_counter += 1
+
+        temporary_path = path + "." + str(os.getpid()) + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temporary_path, "wb") as cache_file:
+                pickle.dump(propagation_master, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary_path, path)
+        except OSError:
+            # The cache directory can be invalid or read-only, the extracted master is then used without storing it
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+        return propagation_master
+
+
+def cache_key(gds_cell, layer_list, truth_table, voltage, input_names) -> str:
+    """
+    Compute the content hash identifying an extracted master.
+
+    Parameters:
+    -----------
+    gds_cell: gdspy.Cell
+        The GDS cell, its referenced cells are hashed too.
+
+    layer_list: list
+        Diffusion layer, N well layer, poly silicon layer, via layers, metal layers and label layers.
+
+    truth_table: dict
+        The truth table of each output extracted from the Liberty file.
+
+    voltage: list[dict]
+        The voltage names and types extracted from the Liberty file.
+
+    input_names: list(str)
+        The inputs names extracted from the Liberty file.
+
+    Returns:
+    --------
+    str:
+        The hexadecimal sha256 digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"auto_ops_cache_v{CACHE_VERSION}".encode())
+    digest.update(extraction_source_digest())
+
+    gds_buffer = io.BytesIO()
+    gds_cell.to_gds(gds_buffer, GDS_MULTIPLIER, timestamp=GDS_TIMESTAMP)
+    for dependency in sorted(gds_cell.get_dependencies(True), key=lambda cell: cell.name):
+        dependency.to_gds(gds_buffer, GDS_MULTIPLIER, timestamp=GDS_TIMESTAMP)
+    digest.update(gds_buffer.getvalue())
+
+    digest.update(repr(layer_list).encode())
+    # The arrays are converted to lists, the NumPy repr summarizes the large arrays
+    truth_table_values = {output_name: None if output_truth_table is None else output_truth_table.tolist()
+                          for output_name, output_truth_table in truth_table.items()}
+    digest.update(repr((truth_table_values, voltage, input_names)).encode())
+
+    return digest.hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def extraction_source_digest() -> bytes:
+    """
+    Compute the hash of the extraction sources, the modules of the GDS_Object package, once per process.
+
+    Returns:
+    --------
+    bytes:
+        The sha256 digest of the module names and contents.
+    """
+    digest = hashlib.sha256()
+    for source_path in sorted(glob.glob(os.path.join(EXTRACTION_SOURCE_DIR, "*.py"))):
+        digest.update(os.path.basename(source_path).encode())
+        with open(source_path, "rb") as source_file:
+            digest.update(source_file.read())
+
+    return digest.digest()
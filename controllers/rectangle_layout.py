@@ -0,0 +1,214 @@
+import numpy as np
+
+
+class RectangleLayout:
+    """
+    Compact layout matrix made of axis-aligned rectangles of constant value.
+
+    The rectangles are stored with their value in drawing order: a rectangle overwrites the rectangles drawn before
+    it, as with slice assignments in a dense matrix. The dense matrix is only built on request.
+
+    Args:
+        shape (tuple[int, int]): The shape of the equivalent dense matrix.
+
+    Attributes:
+        shape (tuple[int, int]): The shape of the equivalent dense matrix.
+        rectangle_list (list[tuple]): The (start_row, end_row, start_column, end_column, value) of each rectangle,
+            end excluded.
+
+    Example usage:
+        >>> layout = RectangleLayout((3000, 3000))
+        >>> layout[10:20, 30:40] = 1.5
+        >>> amp_abs = layout.weighted_sum(psf_table, 0, 0)
+        >>> matrix = layout.to_array()
+    """
+
+    def __init__(self, shape):
+        self.shape = tuple(shape)
+        self.rectangle_list = []
+        self._grid = None
+
+    def __setitem__(self, key, value) -> None:
+        row_slice, column_slice = key
+        start_row, end_row, _ = row_slice.indices(self.shape[0])
+        start_column, end_column, _ = column_slice.indices(self.shape[1])
+
+        if start_row < end_row and start_column < end_column:
+            self.rectangle_list.append((start_row, end_row, start_column, end_column, float(value)))
+            self._grid = None
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        matrix = self.to_array()
+        return matrix if dtype is None else matrix.astype(dtype, copy=False)
+
+    def to_array(self, window=None) -> np.ndarray:
+        """
+        Build the dense matrix of the layout, or of a window of the layout.
+
+        Parameters:
+        -----------
+        window: tuple[slice, slice]
+            The rows and columns of the window, the whole layout if None.
+
+        Returns:
+        --------
+        np.ndarray:
+            The float64 matrix.
+        """
+        if window is None:
+            window = (slice(0, self.shape[0]), slice(0, self.shape[1]))
+        row_slice, column_slice = window
+
+        matrix = np.zeros((row_slice.stop - row_slice.start, column_slice.stop - column_slice.start))
+        for start_row, end_row, start_column, end_column, value in self.rectangle_list:
+            matrix[max(start_row - row_slice.start, 0):max(end_row - row_slice.start, 0),
+                   max(start_column - column_slice.start, 0):max(end_column - column_slice.start, 0)] = value
+
+        return matrix
+
+    def get_bounding_box(self) -> tuple[slice, slice]:
+        """
+        Get the window of the layout containing every rectangle.
+
+        Returns:
+        --------
+        tuple[slice, slice]:
+            The rows and columns of the window, empty without rectangle.
+        """
+        if not self.rectangle_list:
+            return slice(0, 0), slice(0, 0)
+
+        start_row, end_row, start_column, end_column = np.array([rectangle[:4] for rectangle in self.rectangle_list]).T
+
+        return slice(int(start_row.min()), int(end_row.max())), slice(int(start_column.min()), int(end_column.max()))
+
+    def place(self, shape, start_row, start_column) -> "RectangleLayout":
+        """
+        Get the layout moved in a larger matrix.
+
+        Parameters:
+        -----------
+        shape: tuple[int, int]
+            The shape of the larger matrix.
+
+        start_row: int
+            The row of the layout origin in the larger matrix.
+
+        start_column: int
+            The column of the layout origin in the larger matrix.
+
+        Returns:
+        --------
+        RectangleLayout:
+            The moved layout.
+        """
+        layout = RectangleLayout(shape)
+        for start_y, end_y, start_x, end_x, value in self.rectangle_list:
+            layout[start_row + start_y:start_row + end_y, start_column + start_x:start_column + end_x] = value
+
+        return layout
+
+    def get_grid(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Get the layout on the grid made of the rectangle edges, every grid cell has a single value.
+
+        The overlapping rectangles are resolved in drawing order, the grid is computed once.
+
+        Returns:
+        --------
+        tuple[np.ndarray, np.ndarray, np.ndarray]:
+            The row edges, the column edges and the value of each grid cell.
+        """
+        if self._grid is None:
+            rectangles = np.array([rectangle[:4] for rectangle in self.rectangle_list], dtype=np.int64).reshape(-1, 4)
+
+            row_edges = np.unique(rectangles[:, :2])
+            column_edges = np.unique(rectangles[:, 2:])
+            row_indexes = np.searchsorted(row_edges, rectangles[:, :2])
+            column_indexes = np.searchsorted(column_edges, rectangles[:, 2:])
+
+            values = np.zeros((max(len(row_edges) - 1, 0), max(len(column_edges) - 1, 0)))
+            for (start_row, end_row), (start_column, end_column), rectangle in zip(row_indexes, column_indexes,
+                                                                                   self.rectangle_list):
+                values[start_row:end_row, start_column:end_column] = rectangle[4]
+
+            self._grid = row_edges, column_edges, values
+
+        return self._grid
+
+    def weighted_sum(self, table, start_row, start_column) -> float:
+        """
+        Sum the layout weighted by a matrix, without building the dense layout.
+
+        The weight of each grid cell is read from the summed-area table of the matrix, only the grid cells under the
+        matrix are used.
+
+        Parameters:
+        -----------
+        table: np.ndarray
+            The summed-area table of the weight matrix, with a leading row and column of zeros.
+
+        start_row: int
+            The row of the layout under the first row of the weight matrix.
+
+        start_column: int
+            The column of the layout under the first column of the weight matrix.
+
+        Returns:
+        --------
+        float:
+            The sum of the layout values multiplied by the weights.
+        """
+        row_edges, column_edges, values = self.get_grid()
+        if values.size == 0:
+            return 0.0
+
+        # Grid cells intersecting the weight matrix
+        end_row = start_row + table.shape[0] - 1
+        end_column = start_column + table.shape[1] - 1
+        first_row = max(np.searchsorted(row_edges, start_row, side='right') - 1, 0)
+        last_row = min(np.searchsorted(row_edges, end_row, side='left'), len(row_edges) - 1)
+        first_column = max(np.searchsorted(column_edges, start_column, side='right') - 1, 0)
+        last_column = min(np.searchsorted(column_edges, end_column, side='left'), len(column_edges) - 1)
+
+        if first_row >= last_row or first_column >= last_column:
+            return 0.0
+
+        row_table_indexes = np.clip(row_edges[first_row:last_row + 1] - start_row, 0, table.shape[0] - 1)
+        column_table_indexes = np.clip(column_edges[first_column:last_column + 1] - start_column, 0,
+                                       table.shape[1] - 1)
+
+        corners = table[np.ix_(row_table_indexes, column_table_indexes)]
+        weights = corners[1:, 1:] - corners[:-1, 1:] - corners[1:, :-1] + corners[:-1, :-1]
+
+        return float(np.einsum('ij,ij->', values[first_row:last_row, first_column:last_column], weights))
+
+    def separable_weighted_sum(self, row_vector, column_vector) -> float:
+        """
+        Sum the layout weighted by the outer product of a row and a column vector, without building the dense layout.
+
+        The vectors are summed over each segment of the grid edges, the weight of a grid cell is the product of its
+        row and column segment sums.
+
+        Parameters:
+        -----------
+        row_vector: np.ndarray
+            The weight of each layout row.
+
+        column_vector: np.ndarray
+            The weight of each layout column.
+
+        Returns:
+        --------
+        float:
+            The sum of the layout values multiplied by the weights.
+        """
+        row_edges, column_edges, values = self.get_grid()
+        if values.size == 0:
+            return 0.0
+
+        # The segments are summed directly, differences of prefix sums lose the small weights far from the peak
+        row_weights = np.add.reduceat(np.append(row_vector, 0), row_edges)[:-1]
+        column_weights = np.add.reduceat(np.append(column_vector, 0), column_edges)[:-1]
+
+        return float(row_weights @ values @ column_weights)
@@ -0,0 +1,81 @@
+from collections import OrderedDict
+
+# Number of rendered layouts kept by the GUI, a layout is a list of rectangles
+LAYOUT_CACHE_ENTRIES = 64
+
+# Number of EOFM images kept by the GUI, an image is a FOV x FOV float matrix (72 MB for a 3000 x 3000 FOV)
+EOFM_CACHE_ENTRIES = 4
+
+
+class RenderCache:
+    """
+    Bounded LRU cache of rendered results, keyed by every input of the render.
+
+    The least recently used result is dropped when the cache is full. The hits and misses are counted to be displayed
+    in the footer label.
+
+    Args:
+        max_entries (int): The maximum number of cached results.
+
+    Attributes:
+        max_entries (int): The maximum number of cached results.
+        hits (int): The number of renders read from the cache.
+        misses (int): The number of renders computed and cached.
+
+    Example usage:
+        >>> cache = RenderCache(4)
+        >>> R, label = cache.get_or_render(("eofm", image_key, psf_key), lambda: simulation.print_EOFM_image(matrix))
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_or_render(self, key, render_function):
+        """
+        Get the cached result of a render, or render and cache it.
+
+        Parameters:
+        -----------
+        key: tuple | None
+            The hashable inputs of the render, the result is neither read nor cached if None.
+
+        render_function: callable
+            Render the result, only called on a miss.
+
+        Returns:
+        --------
+        object:
+            The rendered result.
+        """
+        if key is None:
+            return render_function()
+
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+        self.misses += 1
+        result = render_function()
+
+        self._entries[key] = result
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        return result
+
+    def clear(self) -> None:
+        """
+        Drop every cached result, the counters are kept.
+
+        Returns:
+        --------
+        None
+        """
+        self._entries.clear()
@@ -0,0 +1,88 @@
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+# The requests sent within this delay in seconds are rendered once, with the latest settings
+RENDER_COALESCE_DELAY = 0.05
+
+
+class RenderWorker(QThread):
+    """
+    Single thread rendering the GUI view, the results are delivered to the GUI thread with a Qt signal.
+
+    Each request carries its own render function, bound to a snapshot of the settings taken in the GUI thread. It is
+    called with a function returning True when the render is stale, and returns the view updates or None if the render
+    has been cancelled.
+
+    A request replaces the pending one: the requests sent during a render or within the coalescing delay are rendered
+    once with the latest snapshot. A render made stale by a newer request is cancelled and never displayed.
+
+    Attributes:
+        rendered (pyqtSignal): Emitted with the request id and the view updates of each completed render.
+        render_lock (threading.Lock): Held during a render, to render outside of the worker.
+        request_counter (int): The number of render requests.
+
+    Example usage:
+        >>> render_worker = RenderWorker()
+        >>> render_worker.rendered.connect(controller.update_rendered_view)
+        >>> render_worker.start()
+        >>> render_worker.request_render(functools.partial(controller.render_snapshot_view, render_snapshot))
+    """
+
+    rendered = pyqtSignal(int, object)
+
+    def __init__(self):
+        super().__init__()
+        self.render_lock = threading.Lock()
+        self.request_counter = 0
+        self._condition = threading.Condition()
+        self._running = True
+        self._render_function = None
+
+    def request_render(self, render_function) -> None:
+        with self._condition:
+            self._render_function = render_function
+            self.request_counter += 1
+            self._condition.notify()
+
+    def stop(self) -> None:
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self.wait()
+
+    def is_stale(self, request_id) -> bool:
+        return self.request_counter != request_id
+
+    def run(self) -> None:
+        rendered_request_id = 0
+
+        while True:
+            with self._condition:
+                while self._running and self.request_counter == rendered_request_id:
+                    self._condition.wait()
+
+                # Wait for the end of a burst of requests
+                request_id = self.request_counter
+                while self._running:
+                    self._condition.wait(RENDER_COALESCE_DELAY)
+                    if self.request_counter == request_id:
+                        break
+                    request_id = self.request_counter
+
+                if not self._running:
+                    return
+
+                render_function = self._render_function
+
+            rendered_request_id = request_id
+
+            with self.render_lock:
+                try:
+                    view_update_list = render_function(lambda: self.is_stale(request_id))
+                except Exception as e:
+                    print(f"Error {e}")
+                    continue
+
+            if view_update_list is not None and not self.is_stale(request_id):
+                self.rendered.emit(request_id, view_update_list)
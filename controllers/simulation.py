@@ -3,7 +3,12 @@ from scipy.signal import fftconvolve
 import cv2
 
 from controllers.GDS_Object.type import ShapeType
+from controllers.eofm_engine import EOFMEngine
 from controllers.gds_drawing import vpi_object_extractor
+from controllers.rectangle_layout import RectangleLayout
+
+# rcv_map uses a single FFT correlation when the windowed sums would visit more than this number of frames
+RCV_MAP_FFT_RATIO = 100
 
 
 class Simulation:
@@ -15,11 +20,34 @@ class Simulation:
 
         self.FOV = 3000
 
+        # Cropped PSF kernels by laser and scale parameters
+        self.psf_kernel_cache = {}
+
+        # Cached PSF spectra for the EOFM image
+        self.eofm_engine = EOFMEngine()
+
     def print_EOFM_image(self, simulation_object):
-        L, psf_label = self.get_psf(FOV=self.FOV)
-        R = fftconvolve(simulation_object, L, mode='same')
+        FOV = self.FOV
+        kernel = self.get_psf_kernel()
+
+        # The FOV x FOV PSF is centered on FOV // 2, the cropped kernel is used when it fits in the FOV
+        if kernel is not None and kernel.shape[0] // 2 <= (FOV - 1) // 2:
+            radius = kernel.shape[0] // 2
+            # Same offset as a 'same' convolution with the FOV x FOV PSF, one pixel shift for an even FOV
+            offset = radius - (FOV // 2 - (FOV - 1) // 2)
+
+            R = self.eofm_engine.convolve(simulation_object, self.psf_kernel_key() + (FOV,), kernel.shape,
+                                          (offset, offset), lambda: kernel)
+        elif not self.is_confocal:
+            # The Gaussian PSF is separable, the rows and the columns are convolved with its 1-D profiles
+            row_vector, column_vector = self.get_psf_vectors(FOV // 2, FOV // 2, (FOV, FOV))
+            R = self.eofm_engine.convolve_separable(simulation_object, row_vector, column_vector,
+                                                    ((FOV - 1) // 2, (FOV - 1) // 2))
+        else:
+            R = self.eofm_engine.convolve(simulation_object, self.psf_kernel_key() + (FOV,), (FOV, FOV),
+                                          ((FOV - 1) // 2, (FOV - 1) // 2), lambda: self.get_psf(FOV=FOV)[0])
 
-        return R, psf_label
+        return R, self.get_psf_label()
 
     def overlay_psf_rcv(self, simulation_object, x_position=1500, y_position=1500):
 
@@ -40,17 +68,29 @@ class Simulation:
 
         FWHM = get_fwhm(lam, NA)
 
-        label = "FWHM = %.02f, is_confocal = %s" % (FWHM, is_confocal)
+        label = self.get_psf_label()
 
         s_x, s_y = (FOV, FOV)  # mat.shape
 
         # Setting up the position of the laser in the matrix
-        if offset is not None:
-            xc = offset[0]
-            yc = offset[1]
-        else:
-            xc = s_x // 2
-            yc = s_y // 2
+        xc, yc = get_psf_center(offset, FOV)
+
+        # The cropped kernel is centered on a pixel
+        kernel = self.get_psf_kernel() if isinstance(xc, int) and isinstance(yc, int) else None
+
+        if kernel is not None:
+            # The PSF is zero outside of the cropped kernel, only the kernel is copied at the laser position
+            L = np.zeros((s_x, s_y))
+            matrix_window, kernel_window = get_psf_window(kernel, xc, yc, L.shape)
+            L[matrix_window] = kernel[kernel_window]
+
+            return L, label
+
+        if not is_confocal:
+            # The Gaussian PSF is the outer product of its row and column profiles
+            row_vector, column_vector = self.get_psf_vectors(xc, yc, (s_x, s_y))
+
+            return np.outer(row_vector, column_vector), label
 
         x, y = np.mgrid[0:s_x, 0:s_y]
 
@@ -75,19 +115,372 @@ class Simulation:
 
         return L, label
 
+    def get_psf_vectors(self, xc, yc, shape) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the non-confocal PSF as a row profile and a column profile, the PSF is their outer product.
+
+        The Gaussian PSF is separable: exp(-(x² + y²) / 2σ²) = exp(-x² / 2σ²) * exp(-y² / 2σ²), the normalization
+        factor is applied to the row profile.
+
+        Parameters:
+        -----------
+        xc: int | float
+            The row of the laser center.
+
+        yc: int | float
+            The column of the laser center.
+
+        shape: tuple[int, int]
+            The PSF shape.
+
+        Returns:
+        --------
+        tuple[np.ndarray, np.ndarray]:
+            The row profile and the column profile.
+        """
+        std = std_dev(self.lam_value, self.NA_value)
+
+        row_vector = 1 / np.sqrt(2 * np.pi * np.square(std)) * get_gaussian_profile(xc, shape[0], self.nm_scale, std)
+        column_vector = get_gaussian_profile(yc, shape[1], self.nm_scale, std)
+
+        return row_vector, column_vector
+
+    def get_psf_pixel_count(self, xc, yc, shape) -> int:
+        """
+        Count the pixels of the non-confocal PSF above zero, as the full Gaussian PSF computed over every pixel.
+
+        The product of the row and column profiles underflows to zero at other pixels than the 2-D Gaussian, the
+        count is made on the 2-D Gaussian. It only decreases with the distance to the laser: the pixels above zero of
+        each row are a range of columns around the laser column, found by a binary search on every row at once.
+
+        Parameters:
+        -----------
+        xc: int | float
+            The row of the laser center.
+
+        yc: int | float
+            The column of the laser center.
+
+        shape: tuple[int, int]
+            The PSF shape.
+
+        Returns:
+        --------
+        int:
+            The number of pixels under the laser.
+        """
+        std = std_dev(self.lam_value, self.NA_value)
+        rows = np.arange(shape[0])
+
+        def is_above_zero(columns) -> np.ndarray:
+            r_squared = (np.square(rows - xc) + np.square(columns - yc)) * np.square(self.nm_scale)
+            return 1 / np.sqrt(2 * np.pi * np.square(std)) * np.exp(-r_squared / (2 * np.square(std))) > 0
+
+        # The column closest to the laser holds the maximum of each row
+        center_columns = np.full(shape[0], min(max(int(np.round(yc)), 0), shape[1] - 1))
+        is_row_above_zero = is_above_zero(center_columns)
+
+        # Last column above zero on the right of the laser
+        low, high = center_columns, np.full(shape[0], shape[1] - 1)
+        while np.any(low < high):
+            middle = (low + high + 1) // 2
+            is_middle_above_zero = is_above_zero(middle)
+            low, high = np.where(is_middle_above_zero, middle, low), np.where(is_middle_above_zero, high, middle - 1)
+        end_columns = low
+
+        # First column above zero on the left of the laser
+        low, high = np.zeros(shape[0], dtype=int), center_columns
+        while np.any(low < high):
+            middle = (low + high) // 2
+            is_middle_above_zero = is_above_zero(middle)
+            low, high = np.where(is_middle_above_zero, low, middle + 1), np.where(is_middle_above_zero, middle, high)
+        start_columns = low
+
+        return int(np.sum(np.where(is_row_above_zero, end_columns - start_columns + 1, 0)))
+
+    def get_psf_label(self) -> str:
+        return "FWHM = %.02f, is_confocal = %s" % (get_fwhm(self.lam_value, self.NA_value), self.is_confocal)
+
+    def get_psf_kernel(self):
+        """
+        Get the PSF cropped to the laser spot, centered on the laser.
+
+        The kernel only depends on the laser and scale parameters, it is computed once for each
+        (lam, NA, nm_scale, is_confocal) and memoized.
+
+        Returns:
+        --------
+        np.ndarray | None:
+            The square kernel of odd size, None if the PSF is not bounded (not confocal).
+        """
+        if not self.is_confocal:
+            return None
+
+        key = self.psf_kernel_key()
+        if key not in self.psf_kernel_cache:
+            lam = self.lam_value
+            NA = self.NA_value
+
+            FWHM = get_fwhm(lam, NA)
+
+            # The pixels further than one pixel out of the FWHM radius are always cleared
+            radius = int(FWHM / self.nm_scale) + 1
+
+            x, y = np.mgrid[-radius:radius + 1, -radius:radius + 1]
+
+            r_squared = (np.square(x) + np.square(y)) * np.square(self.nm_scale)
+
+            y = 1 / np.sqrt(2 * np.pi * np.square(std_dev(lam, NA))) * np.exp(
+                -r_squared / (2 * np.square(std_dev(lam, NA))))
+
+            r = np.sqrt(r_squared)
+
+            kernel = y * (r <= FWHM)
+
+            # The number of pixels under the laser and the summed-area table are stored with the kernel
+            self.psf_kernel_cache[key] = kernel, np.count_nonzero(kernel), get_summed_area_table(kernel)
+
+        return self.psf_kernel_cache[key][0]
+
+    def psf_kernel_key(self) -> tuple:
+        return self.lam_value, self.NA_value, self.nm_scale, self.is_confocal
+
     def calc_RCV(self, simulation_object, offset=None):
 
         L, _ = self.get_psf(offset, self.FOV)
 
-        amp_abs = np.sum(simulation_object * L)
+        amp_rel, rcv_label = self.calc_RCV_value(simulation_object, offset, L)
+
+        return np.where(L > 0, 1, 0), L, amp_rel, rcv_label
+
+    def calc_RCV_value(self, simulation_object, offset=None, L=None):
+        """
+        Calculate the RCV value at the laser position.
 
-        num_pix_under_laser = np.sum(L > 0)
+        With a cropped PSF kernel, only the window of the simulation object under the kernel is used.
+
+        Parameters:
+        -----------
+        simulation_object: np.ndarray
+            The FOV x FOV layout matrix.
+
+        offset: list[int]
+            The laser position as [row, column], the center of the FOV if None.
+
+        L: np.ndarray
+            The full PSF, used when the laser is not centered on a pixel (computed if None).
+
+        Returns:
+        --------
+        tuple[float, str]:
+            The RCV value per nm² and its label.
+        """
+        xc, yc = get_psf_center(offset, self.FOV)
+
+        # The cropped kernel is centered on a pixel
+        kernel = self.get_psf_kernel() if isinstance(xc, int) and isinstance(yc, int) else None
+
+        if not self.is_confocal:
+            # Separable PSF: the layout is reduced by the row profile and then by the column profile
+            row_vector, column_vector = self.get_psf_vectors(xc, yc, simulation_object.shape)
+
+            if isinstance(simulation_object, RectangleLayout):
+                amp_abs = simulation_object.separable_weighted_sum(row_vector, column_vector)
+            else:
+                amp_abs = row_vector @ simulation_object @ column_vector
+            num_pix_under_laser = self.get_psf_pixel_count(xc, yc, simulation_object.shape)
+        elif kernel is not None:
+            matrix_window, kernel_window = get_psf_window(kernel, xc, yc, simulation_object.shape)
+            L_window = kernel[kernel_window]
+
+            if isinstance(simulation_object, RectangleLayout):
+                # The PSF is summed over each rectangle with the summed-area table of the kernel
+                radius = kernel.shape[0] // 2
+                amp_abs = simulation_object.weighted_sum(self.psf_kernel_cache[self.psf_kernel_key()][2],
+                                                         xc - radius, yc - radius)
+            else:
+                amp_abs = np.einsum('ij,ij->', simulation_object[matrix_window], L_window)
+            if L_window.shape == kernel.shape:
+                num_pix_under_laser = self.psf_kernel_cache[self.psf_kernel_key()][1]
+            else:
+                num_pix_under_laser = np.count_nonzero(L_window)
+        else:
+            if L is None:
+                L, _ = self.get_psf(offset, self.FOV)
+
+            amp_abs = np.sum(np.asarray(simulation_object) * L)
+            num_pix_under_laser = np.sum(L > 0)
 
         amp_rel = amp_abs / num_pix_under_laser
 
         rcv_label = "RCV (per nm²) = %.6f" % amp_rel
 
-        return np.where(L > 0, 1, 0), L, amp_rel, rcv_label
+        return amp_rel, rcv_label
+
+    def rcv_map(self, simulation_object, positions=None, x_positions=None, y_positions=None) -> np.ndarray:
+        """
+        Calculate the RCV value at many laser positions at once.
+
+        For a large number of positions, the layout is correlated once with the cropped PSF kernel by FFT and the
+        number of pixels under the laser is read from a summed-area table of the kernel. Without confocal, the
+        layout is reduced once by the Gaussian row profile of each laser row. Otherwise each value is calculated with
+        calc_RCV_value.
+
+        Parameters:
+        -----------
+        simulation_object: np.ndarray
+            The FOV x FOV layout matrix.
+
+        positions: list[tuple[int, int]]
+            The (x_position, y_position) laser positions.
+
+        x_positions: list[int]
+            The x positions of the grid, used with y_positions when positions is None.
+
+        y_positions: list[int]
+            The y positions of the grid, used with x_positions when positions is None.
+
+        Returns:
+        --------
+        np.ndarray:
+            The RCV value of each position, or the [len(y_positions), len(x_positions)] grid of values.
+        """
+        if positions is None:
+            grid_x, grid_y = np.meshgrid(np.asarray(x_positions), np.asarray(y_positions))
+            values = self.rcv_map(simulation_object, list(zip(grid_x.ravel().tolist(), grid_y.ravel().tolist())))
+            return values.reshape(grid_x.shape)
+
+        # X and y are reversed because we are using the matrix with origin lower
+        centers = [get_psf_center([y_position, x_position], self.FOV) for x_position, y_position in positions]
+        is_on_pixel = all(isinstance(xc, int) and isinstance(yc, int) for xc, yc in centers)
+
+        kernel = self.get_psf_kernel() if is_on_pixel else None
+
+        if not self.is_confocal and not isinstance(simulation_object, RectangleLayout):
+            # Separable PSF: the layout is reduced once by the row profile of each laser row
+            row_centers, row_indexes = np.unique([xc for xc, _ in centers], return_inverse=True)
+            column_centers, column_indexes = np.unique([yc for _, yc in centers], return_inverse=True)
+
+            row_vectors = np.array([self.get_psf_vectors(xc, 0, simulation_object.shape)[0] for xc in row_centers])
+            column_vectors = np.array([self.get_psf_vectors(0, yc, simulation_object.shape)[1]
+                                       for yc in column_centers])
+
+            amp_abs = np.einsum('ij,ij->i', (row_vectors @ simulation_object)[row_indexes],
+                                column_vectors[column_indexes])
+            pixel_counts = {}
+            for center in centers:
+                if center not in pixel_counts:
+                    pixel_counts[center] = self.get_psf_pixel_count(center[0], center[1], simulation_object.shape)
+            num_pix_under_laser = np.array([pixel_counts[center] for center in centers])
+
+            return amp_abs / num_pix_under_laser
+
+        if isinstance(simulation_object, RectangleLayout) and kernel is None and self.is_confocal:
+            simulation_object = simulation_object.to_array()
+
+        # A rectangle layout is summed without the dense matrix at each position
+        if kernel is None or isinstance(simulation_object, RectangleLayout) or \
+                len(centers) * kernel.size < RCV_MAP_FFT_RATIO * simulation_object.size:
+            return np.array([self.calc_RCV_value(simulation_object, offset=list(center))[0] for center in centers],
+                            dtype=float)
+
+        radius = kernel.shape[0] // 2
+
+        # The kernel is symmetric: the full convolution is the correlation for every center from -radius to
+        # shape + radius, at index center + radius
+        amp_abs = fftconvolve(simulation_object, kernel, mode='full')
+
+        pixel_table = get_summed_area_table(kernel > 0)
+
+        values = np.full(len(centers), np.nan)
+        for index, (xc, yc) in enumerate(centers):
+            matrix_window, kernel_window = get_psf_window(kernel, xc, yc, simulation_object.shape)
+            if matrix_window[0].start == matrix_window[0].stop or matrix_window[1].start == matrix_window[1].stop:
+                # The laser is out of the layout
+                continue
+
+            start_x, end_x = kernel_window[0].start, kernel_window[0].stop
+            start_y, end_y = kernel_window[1].start, kernel_window[1].stop
+            num_pix_under_laser = (pixel_table[end_x, end_y] - pixel_table[start_x, end_y]
+                                   - pixel_table[end_x, start_y] + pixel_table[start_x, start_y])
+
+            values[index] = amp_abs[xc + radius, yc + radius] / num_pix_under_laser
+
+        return values
+
+
+def get_psf_center(offset, FOV) -> tuple:
+    if offset is not None:
+        # The positions updated from the command line are floats, a position on a pixel is converted to int
+        return tuple(int(position) if float(position).is_integer() else position for position in offset[:2])
+
+    return FOV // 2, FOV // 2
+
+
+def get_psf_window(kernel, xc, yc, shape) -> tuple[tuple[slice, slice], tuple[slice, slice]]:
+    """
+    Get the overlapping windows of a matrix and of a kernel centered on (xc, yc).
+
+    Parameters:
+    -----------
+    kernel: np.ndarray
+        The square kernel of odd size.
+
+    xc: int
+        The row of the kernel center in the matrix.
+
+    yc: int
+        The column of the kernel center in the matrix.
+
+    shape: tuple[int, int]
+        The matrix shape.
+
+    Returns:
+    --------
+    tuple[tuple[slice, slice], tuple[slice, slice]]:
+        The matrix window and the kernel window, both empty if the kernel is out of the matrix.
+    """
+    radius = kernel.shape[0] // 2
+
+    start_x = min(max(xc - radius, 0), shape[0])
+    end_x = min(max(xc + radius + 1, 0), shape[0])
+    start_y = min(max(yc - radius, 0), shape[1])
+    end_y = min(max(yc + radius + 1, 0), shape[1])
+
+    matrix_window = (slice(start_x, end_x), slice(start_y, end_y))
+    kernel_window = (slice(start_x - xc + radius, end_x - xc + radius),
+                     slice(start_y - yc + radius, end_y - yc + radius))
+
+    return matrix_window, kernel_window
+
+
+def get_summed_area_table(matrix) -> np.ndarray:
+    """
+    Get the summed-area table of a matrix, with a leading row and column of zeros.
+
+    The sum of matrix[a:b, c:d] is table[b, d] - table[a, d] - table[b, c] + table[a, c].
+
+    Returns:
+    --------
+    np.ndarray:
+        The (rows + 1, columns + 1) table.
+    """
+    table = np.zeros((matrix.shape[0] + 1, matrix.shape[1] + 1), dtype=np.result_type(matrix, np.int64))
+    table[1:, 1:] = np.cumsum(np.cumsum(matrix, axis=0), axis=1)
+
+    return table
+
+
+def get_gaussian_profile(center, size, nm_scale, std) -> np.ndarray:
+    """
+    Get the 1-D Gaussian profile exp(-d² / 2σ²) of the distance d in nm to the center, along an axis of pixels.
+
+    Returns:
+    --------
+    np.ndarray:
+        The profile of each pixel.
+    """
+    return np.exp(-np.square((np.arange(size) - center) * nm_scale) / (2 * np.square(std)))
 
 
 def get_fwhm(lam, NA):
@@ -102,7 +495,7 @@ def rcv_parameter(K, voltage, beta, Pl):
     return voltage * K * beta * Pl
 
 
-def export_simulation_object(propagation_object, G1, G2, FOV, nm_scale=None):
+def export_simulation_object(propagation_object, G1, G2, FOV, nm_scale=None, sparse=False):
     if nm_scale is not None:
         scale_up = int(1000 / nm_scale)
     else:
@@ -117,43 +510,44 @@ def export_simulation_object(propagation_object, G1, G2, FOV, nm_scale=None):
     if height > FOV:
         height = FOV
 
-    layout = np.zeros((height, width))
-    x_m, y_m = np.meshgrid(np.arange(width), np.arange(height))
+    # A sparse layout only stores the zone rectangles
+    layout = RectangleLayout((height, width)) if sparse else np.zeros((height, width))
 
-    for reflection in propagation_object.reflection_list:
-        for zone in reflection.zone_list:
-            x, y = zone.coordinates
+    for reflection, zone, state in propagation_object.iter_zones():
+        x, y = zone.coordinates
 
-            x = tuple([int(element * scale_up) for element in x])
-            y = tuple([int(element * scale_up) for element in y])
+        x = tuple([int(element * scale_up) for element in x])
+        y = tuple([int(element * scale_up) for element in y])
 
-            state = zone.state
-            value = None
-            if state is None:
-                state = False
-            if reflection.shape_type == ShapeType.PMOS:
-                if not state:
-                    value = G2
-            else:
-                if state:
-                    value = G1
+        value = None
+        if state is None:
+            state = False
+        if reflection.shape_type == ShapeType.PMOS:
+            if not state:
+                value = G2
+        else:
+            if state:
+                value = G1
 
-            if value is not None:
-                mask = (x_m >= min(x)) & (x_m <= max(x)) & (y_m >= min(y)) & (y_m <= max(y))
-                layout[mask] = value
+        if value is not None:
+            fill_zone(layout, x, y, value)
 
     large_matrix_rows, large_matrix_columns = FOV, FOV
-    simulation_object = np.zeros((large_matrix_rows, large_matrix_columns))
     start_row = (large_matrix_rows - height) // 2
     start_col = (large_matrix_columns - width) // 2
-    simulation_object[start_row:start_row + height, start_col:start_col + width] = layout
+    if sparse:
+        simulation_object = layout.place((large_matrix_rows, large_matrix_columns), start_row, start_col)
+    else:
+        simulation_object = np.zeros((large_matrix_rows, large_matrix_columns))
+        simulation_object[start_row:start_row + height, start_col:start_col + width] = layout
 
     nm_scale = int(1000 / scale_up)
 
     return simulation_object, nm_scale
 
 
-def benchmark_simulation_object(object_list, def_extract, G1, G2, FOV, vpi_extraction=None, area=0, nm_scale=None):
+def benchmark_simulation_object(object_list, def_extract, G1, G2, FOV, vpi_extraction=None, area=0, nm_scale=None,
+                                sparse=False):
     patch_size = def_extract[0]["patch_size"]
 
     def_zone = def_extract[1][area]
@@ -188,9 +582,70 @@ def benchmark_simulation_object(object_list, def_extract, G1, G2, FOV, vpi_extra
     if height > FOV:
         height = FOV
 
-    x_m, y_m = np.meshgrid(np.arange(width), np.arange(height))
-    layout = np.zeros((height, width))
-    for cell_name, cell_place in def_zone['gates'].items():
+    # A sparse layout only stores the zone rectangles
+    layout = RectangleLayout((height, width)) if sparse else np.zeros((height, width))
+    fill_gates(layout, object_list, def_zone['gates'], G1, G2, origin_x, origin_y, scale_up,
+               vpi_extraction=vpi_extraction)
+
+    large_matrix_rows, large_matrix_columns = FOV, FOV
+    start_row = (large_matrix_rows - height) // 2
+    start_col = (large_matrix_columns - width) // 2
+    if sparse:
+        simulation_object = layout.place((large_matrix_rows, large_matrix_columns), start_row, start_col)
+    else:
+        simulation_object = np.zeros((large_matrix_rows, large_matrix_columns))
+        simulation_object[start_row:start_row + height, start_col:start_col + width] = layout
+
+    nm_scale = int(1000 / scale_up)
+
+    return simulation_object, nm_scale
+
+
+def fill_gates(layout, object_list, gates, G1, G2, origin_x, origin_y, scale_up, offset_x=0, offset_y=0,
+               vpi_extraction=None) -> None:
+    """
+    Fill the reflective zones of placed gates in the layout matrix.
+
+    Parameters:
+    -----------
+    layout: np.ndarray
+        The layout matrix indexed by [y, x].
+
+    object_list: dict
+        The propagation states by cell name and input combination.
+
+    gates: dict
+        The placed gates by cell name, from the DEF extraction.
+
+    G1: float
+        The reflection value of the NMOS zones.
+
+    G2: float
+        The reflection value of the PMOS zones.
+
+    origin_x: float
+        The x coordinate in um of the pixel grid origin.
+
+    origin_y: float
+        The y coordinate in um of the pixel grid origin.
+
+    scale_up: int
+        The number of pixels per um.
+
+    offset_x: int
+        The x pixel of the pixel grid at the first layout column.
+
+    offset_y: int
+        The y pixel of the pixel grid at the first layout row.
+
+    vpi_extraction: dict
+        The input and output combinations of each gate, the first combination of the cell is used if None.
+
+    Returns:
+    --------
+    None
+    """
+    for cell_name, cell_place in gates.items():
         if cell_name in object_list.keys():
             for position in cell_place:
                 if vpi_extraction:
@@ -201,34 +656,53 @@ def benchmark_simulation_object(object_list, def_extract, G1, G2, FOV, vpi_extra
                     key = key_list[0]
                     propagation_object = object_list[cell_name][key]
 
-                for zone in propagation_object.orientation_list[position['Orientation']]:
-                    x, y = zone["coords"]
-                    x_adder, y_adder = position['Coordinates']
-                    x = tuple([int(((element + x_adder) - origin_x) * scale_up) for element in x])
-                    y = tuple([int(((element + y_adder) - origin_y) * scale_up) for element in y])
+                geometry = propagation_object.orientation_list[position['Orientation']]
+                state_vector = propagation_object.state_vector
+                x_adder, y_adder = position['Coordinates']
 
-                    state = zone["state"]
+                # Pixel bounding box of every zone, the truncation keeps the order of the bounds
+                bounds = geometry['bounds']
+                x = (((bounds[:, :2] + x_adder) - origin_x) * scale_up).astype(np.int64) - offset_x
+                y = (((bounds[:, 2:] + y_adder) - origin_y) * scale_up).astype(np.int64) - offset_y
 
-                    value = None
-                    if state is None:
-                        state = False
-                    if zone["diff_type"] == ShapeType.PMOS:
-                        if not state:
-                            value = G2
-                    else:
-                        if state:
-                            value = G1
+                # A PMOS zone reflects unless at 1 (unknown included), an NMOS zone only at 1
+                is_pmos = geometry['is_pmos']
+                is_reflecting = np.where(is_pmos, state_vector != 1, state_vector == 1)
+                values = np.where(is_pmos, G2, G1)
 
-                    if value is not None:
-                        mask = (x_m >= min(x)) & (x_m <= max(x)) & (y_m >= min(y)) & (y_m <= max(y))
-                        layout[mask] = value
+                for zone_index in np.flatnonzero(is_reflecting):
+                    fill_zone(layout, x[zone_index], y[zone_index], values[zone_index])
 
-    large_matrix_rows, large_matrix_columns = FOV, FOV
-    simulation_object = np.zeros((large_matrix_rows, large_matrix_columns))
-    start_row = (large_matrix_rows - height) // 2
-    start_col = (large_matrix_columns - width) // 2
-    simulation_object[start_row:start_row + height, start_col:start_col + width] = layout
 
-    nm_scale = int(1000 / scale_up)
+def fill_zone(layout, x, y, value) -> None:
+    """
+    Fill the bounding box of a zone in the layout matrix, bounds included.
 
-    return simulation_object, nm_scale
+    The box is clipped to the layout and written with a slice, so only the zone pixels are visited.
+
+    Parameters:
+    -----------
+    layout: np.ndarray
+        The layout matrix indexed by [y, x].
+
+    x: tuple(int)
+        The x pixel coordinates of the zone.
+
+    y: tuple(int)
+        The y pixel coordinates of the zone.
+
+    value: float
+        The reflection value of the zone.
+
+    Returns:
+    --------
+    None
+    """
+    height, width = layout.shape
+
+    start_x = min(max(min(x), 0), width)
+    end_x = min(max(max(x) + 1, 0), width)
+    start_y = min(max(min(y), 0), height)
+    end_y = min(max(max(y) + 1, 0), height)
+
+    layout[start_y:end_y, start_x:end_x] = value
@@ -1,16 +1,16 @@
 import ast
-import copy
 import itertools
 import sys
 import time
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 import gdspy
 
 from controllers import gds_drawing
-from controllers.GDS_Object.auto_ops_propagation import AutoOPSPropagation
 from controllers.def_parser import get_gates_info_from_def_file
 from controllers.lib_reader import LibReader
+from controllers.propagation_cache import PropagationCache, DEFAULT_CACHE_DIR
 
 
 def run_cli():
@@ -36,6 +36,11 @@ def run_cli():
     parser_command_line.add_argument('-f', '--flip_flop', type=int, help='Flip Flop output Q')
     parser_command_line.add_argument('-o', '--output', help='Output type', choices=['reflection_over_cell'])
 
+    parser_command_line.add_argument('--cache_dir', default=DEFAULT_CACHE_DIR, help=f'Extracted cells cache directory (default {DEFAULT_CACHE_DIR})')
+    parser_command_line.add_argument('--no_cache', action='store_true', help='Bypass the extracted cells cache')
+    parser_command_line.add_argument('--clear_cache', action='store_true', help='Invalidate the extracted cells cache before running')
+    parser_command_line.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes for the cells extraction and propagation (default 1)')
+
     parser_gui = subparsers.add_parser('gui', help='GUI mode for simulation')
     parser_gui.add_argument('-cli', '--command_line', action='store_true', help='Use the GUI as a command line tool')
     parser_gui.add_argument('-s', '--script', help='Add an input script based on available commands in the GUI_cli')
@@ -59,8 +64,11 @@ def run_cli():
         benchmark_plot = args.benchmark_plot
         patch_size = args.patch_size
         unit_test = args.unit_test
+        cache_dir = None if args.no_cache else args.cache_dir
+        clear_cache = args.clear_cache
+        jobs = args.jobs
 
-        run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_list, output, verbose_mode, unit_test, flip_flop, vpi_file, benchmark_plot, patch_size)
+        run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_list, output, verbose_mode, unit_test, flip_flop, vpi_file, benchmark_plot, patch_size, cache_dir, clear_cache, jobs)
 
 
 def run_gui(command_line, config, script):
@@ -85,13 +93,143 @@ def run_gui(command_line, config, script):
 
 
 
-def run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_name_list, output, verbose_mode, unit_test, flip_flop, vpi_file, benchmark_plot, patch_size):
+# Per process objects used by process_cell, set by init_cell_context in each worker
+cell_context = {}
+
+
+def init_cell_context(std_file, lib_file, layer_list, cache_dir, gds_cell_list=None, lib_reader=None):
+    if gds_cell_list is None:
+        gds_cell_list = gdspy.GdsLibrary().read_gds(std_file).cells
+
+    if lib_reader is None:
+        lib_reader = LibReader(lib_file)
+
+    cell_context['gds_cell_list'] = gds_cell_list
+    cell_context['lib_reader'] = lib_reader
+    cell_context['layer_list'] = layer_list
+    cell_context['propagation_cache'] = PropagationCache(cache_dir)
+
+
+def process_cell(gds_cell_name, cell_input, output, verbose_mode, unit_test, flip_flop, def_file) -> dict:
+    """
+    Extract a cell and propagate every requested input combination.
+
+    This is the unit of work of run_auto_ops, run in the current process or in a worker process.
+    Verbose messages are returned instead of printed so that the caller prints them in the cell order.
+
+    Returns:
+    --------
+    dict:
+        exporting (list | dict): The state results (list for unit tests, dict keyed by input string otherwise).
+        state_counter (int): The number of propagated states.
+        messages (list(str)): The verbose messages of the cell.
+        state_error (bool): A state propagation failed in verbose mode.
+        cell_error (bool): The cell extraction failed in verbose mode.
+    """
+    orange_color = "\033[1;33m"
+    reset_color = "\033[0m"
+    green_color = "\033[1;32m"
+    red_color = "\033[1;31m"
+
+    gds_cell = cell_context['gds_cell_list'][gds_cell_name]
+    lib_reader = cell_context['lib_reader']
+    layer_list = cell_context['layer_list']
+    propagation_cache = cell_context['propagation_cache']
+
+    result = {'exporting': [], 'state_counter': 0, 'messages': [], 'state_error': False, 'cell_error': False}
+    internal_state_error = 0
+
+    try:
+        truth_table, voltage, input_names, is_flip_flop = lib_reader.extract_truth_table(gds_cell_name)
+        propagation_master = propagation_cache.get_propagation_master(gds_cell_name, gds_cell, layer_list, truth_table, voltage, input_names)
+
+        draw_inputs = {}
+
+        if cell_input and len(cell_input) == len(input_names):
+            for index, inp in enumerate(input_names):
+                draw_inputs[inp] = cell_input[index]
+
+            propagation_master.apply_state(draw_inputs, flip_flop)
+
+            if output == "reflection_over_cell":
+                gds_drawing.export_reflection_to_png_over_gds_cell(propagation_master, True, False, flip_flop)
+
+            result['state_counter'] += 1
+
+        else:
+            input_number = len(input_names)
+            if is_flip_flop:
+                input_number += 1
+
+            combinations = list(itertools.product([0, 1], repeat=input_number))
+
+            if unit_test:
+                result['exporting'] = []
+            else:
+                result['exporting'] = {}
+
+            # Every combination is propagated at once, the reflection over cell export needs the applied master
+            if output == "reflection_over_cell":
+                state_result_list = [None] * len(combinations)
+            else:
+                state_result_list = propagation_master.get_all_state_results(is_flip_flop, flip_flop)
+
+            for combination, state_result in zip(combinations, state_result_list):
+                for index, inp in enumerate(input_names):
+                    draw_inputs[inp] = combination[index]
+                try:
+                    if is_flip_flop:
+                        flip_flop = combination[-1]
+
+                    if output == "reflection_over_cell":
+                        # The master is reset by apply_state, only the zone states are kept for each combination
+                        propagation_master.apply_state(draw_inputs, flip_flop)
+                        gds_drawing.export_reflection_to_png_over_gds_cell(propagation_master, True, False, flip_flop)
+                        state_result = propagation_master.get_state_result()
+
+                    elif state_result is None:
+                        raise ValueError(f"The propagation of {gds_cell_name} with the inputs {draw_inputs} "
+                                         f"(flip-flop {flip_flop}) reaches a pin without state")
+
+                    if def_file:
+                        key = ''.join(map(str, combination))
+                        if is_flip_flop:
+                            key = key + "_" + str(flip_flop)
+                        result['exporting'][key] = state_result
+
+                    if unit_test:
+                        result['exporting'].append(state_result)
+
+                    result['state_counter'] += 1
+
+                except Exception as e:
+                    internal_state_error += 1
+                    if verbose_mode:
+                        result['messages'].append(f"{orange_color}\nCell processing error {draw_inputs} \nType : {e}{reset_color}")
+                        # traceback.print_exc()
+                        result['state_error'] = True
+
+        if verbose_mode:
+            if internal_state_error > 0:
+                state_length = pow(2, len(input_names))
+                result['messages'].append(f"{red_color}\n{internal_state_error}/{state_length} processes failed{reset_color}")
+            else:
+                result['messages'].append(f'\n{green_color}Processing complete.{reset_color}')
+
+    except Exception as e:
+        if verbose_mode:
+            result['messages'].append(f"{red_color}An error occurred: {e}{reset_color}")
+            #traceback.print_exc()
+            result['cell_error'] = True
+
+    return result
+
+
+def run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_name_list, output, verbose_mode, unit_test, flip_flop, vpi_file, benchmark_plot, patch_size, cache_dir=DEFAULT_CACHE_DIR, clear_cache=False, jobs=1):
     blue_color = "\033[1;34m"
     reset_color = "\033[0m"
-    orange_color = "\033[1;33m"
     white_color = "\033[1;37m"
     green_color = "\033[1;32m"
-    red_color = "\033[1;31m"
 
     start_time = time.time()
 
@@ -117,7 +255,8 @@ def run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_name
     if unit_test:
         print(f"{blue_color}Reading lib file ...{reset_color}")
 
-    lib_reader = LibReader(lib_file)
+    if clear_cache:
+        PropagationCache(cache_dir, clear_cache)
 
     if cell_name_list is None:
         cell_name_list = gds_cell_list.keys()
@@ -129,19 +268,26 @@ def run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_name
     total_iterations = len(cell_name_list)
     multiple_exporting_dict = {}
 
-    for input_cell_name in cell_name_list:
-        for gds_cell_name, gds_cell in gds_cell_list.items():
-            if gds_cell_name != input_cell_name:
-                continue
+    gds_cell_name_list = [cell_name for cell_name in cell_name_list if cell_name in gds_cell_list]
+    cell_arguments = (cell_input, output, verbose_mode, unit_test, flip_flop, def_file)
+
+    executor = None
+    if jobs is not None and jobs > 1:
+        executor = ProcessPoolExecutor(max_workers=jobs, initializer=init_cell_context,
+                                       initargs=(std_file, lib_file, layer_list, cache_dir))
+        # Results are streamed back in the cell order
+        cell_results = executor.map(process_cell, gds_cell_name_list, *[itertools.repeat(argument) for argument in cell_arguments])
+    else:
+        init_cell_context(std_file, lib_file, layer_list, cache_dir, gds_cell_list=gds_cell_list)
+        cell_results = (process_cell(gds_cell_name, *cell_arguments) for gds_cell_name in gds_cell_name_list)
 
+    try:
+        for gds_cell_name, cell_result in zip(gds_cell_name_list, cell_results):
             counter += 1
-            internal_state_error = 0
 
             if unit_test:
                 print(f"{blue_color}Generating test object for: {gds_cell_name} ...{reset_color}")
 
-            multiple_exporting_dict[gds_cell_name] = []
-
             # start progress bar
             if verbose_mode:
                 progress = counter / total_iterations
@@ -153,81 +299,20 @@ def run_auto_ops(std_file, lib_file, def_file, cell_input, layer_list, cell_name
                     end='', flush=True)
             # end progress bar
 
-            try:
-                truth_table, voltage, input_names, is_flip_flop = lib_reader.extract_truth_table(gds_cell_name)
-                propagation_master = AutoOPSPropagation(gds_cell_name, gds_cell, layer_list, truth_table, voltage, input_names)
-
-                draw_inputs = {}
+            for message in cell_result['messages']:
+                print(message)
 
-                if cell_input and len(cell_input) == len(input_names):
-                    for index, inp in enumerate(input_names):
-                        draw_inputs[inp] = cell_input[index]
+            multiple_exporting_dict[gds_cell_name] = cell_result['exporting']
+            state_counter += cell_result['state_counter']
 
-                    propagation_object = copy.deepcopy(propagation_master)
-                    propagation_object.apply_state(draw_inputs, flip_flop)
+            if cell_result['state_error'] and gds_cell_name not in error_cell_list:
+                error_cell_list.append(gds_cell_name)
 
-                    if output == "reflection_over_cell":
-                        gds_drawing.export_reflection_to_png_over_gds_cell(propagation_object, True, False, flip_flop)
-
-                    state_counter += 1
-
-                else:
-                    input_number = len(input_names)
-                    if is_flip_flop:
-                        input_number += 1
-
-                    combinations = list(itertools.product([0, 1], repeat=input_number))
-
-                    if unit_test:
-                        multiple_exporting_dict[gds_cell_name] = []
-                    else:
-                        multiple_exporting_dict[gds_cell_name] = {}
-
-                    for combination in combinations:
-                        for index, inp in enumerate(input_names):
-                            draw_inputs[inp] = combination[index]
-                        try:
-                            if is_flip_flop:
-                                flip_flop = combination[-1]
-
-                            propagation_object = copy.deepcopy(propagation_master)
-                            propagation_object.apply_state(draw_inputs, flip_flop)
-
-                            if output == "reflection_over_cell":
-                                gds_drawing.export_reflection_to_png_over_gds_cell(propagation_object, True, False, flip_flop)
-
-                            if def_file:
-                                propagation_object.calculate_orientations()
-                                key = ''.join(map(str, combination))
-                                if is_flip_flop:
-                                    key = key + "_" + str(flip_flop)
-                                multiple_exporting_dict[gds_cell_name][key] = copy.deepcopy(propagation_object)
-
-                            if unit_test:
-                                multiple_exporting_dict[gds_cell_name].append(copy.deepcopy(propagation_object))
-
-                            state_counter += 1
-
-                        except Exception as e:
-                            internal_state_error += 1
-                            if verbose_mode:
-                                print(f"{orange_color}\nCell processing error {draw_inputs} \nType : {e}{reset_color}")
-                                # traceback.print_exc()
-                                if gds_cell_name not in error_cell_list:
-                                    error_cell_list.append(gds_cell_name)
-
-                if verbose_mode:
-                    if internal_state_error > 0:
-                        state_length = pow(2, len(input_names))
-                        print(f"{red_color}\n{internal_state_error}/{state_length} processes failed{reset_color}")
-                    else:
-                        print(f'\n{green_color}Processing complete.{reset_color}')
-
-            except Exception as e:
-                if verbose_mode:
-                    print(f"{red_color}An error occurred: {e}{reset_color}")
-                    #traceback.print_exc()
-                    error_cell_list.append(gds_cell_name)
+            if cell_result['cell_error']:
+                error_cell_list.append(gds_cell_name)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     end_time_log = time.time()
     gds_drawing.write_output_log(start_time, end_time_log, filtered_cells=cell_name_list, state_counter=state_counter,